@@ -0,0 +1,506 @@
+"""Autopilot, it plays the game by itself.
+
+It turns the snake through Snake.queue_direction, like a player would,
+so it plays in any scene with a snake. Press 'A' in game to let it
+play, or leave it playing as a load generator for soak tests:
+
+    python autopilot.py --board 400x300 --seconds 600 --fast
+
+Every cell gets its distance to the closest apple, going around walls
+and across the edges of the board, since they wrap around. Distances
+only change when apples do, so they are searched once per apple, a bit
+every frame within a time budget, going on where the last frame
+stopped. Cells the search didn't reach yet get the distance as the crow
+flies.
+
+The snake changes every tick, so it isn't part of the distances. It is
+avoided when choosing the next cell, through the occupancy grid it
+keeps up to date while moving. A cell is only taken if the tail can be
+reached from there, or there is plenty of room: the snake can always
+follow its tail out of a corridor, but it can't turn around. Looking
+for room takes time too: on a tick with a decision the search gets half
+the budget, and the room that wasn't seen in the rest doesn't count.
+
+The cycle solver plays to the end instead, until the board is full. It
+follows a Hamiltonian cycle, a path through every cell and back to the
+start, so it never gets trapped; shortcuts along the cycle make it fast
+enough. Boards without walls only, it is the reference workload for the
+end of a game:
+
+    python autopilot.py --fill --board 25x20"""
+import os
+import argparse
+from array import array
+from collections import deque
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+import pygame
+
+from objects import Apple, Board, Occupancy, Snake
+from consts import OPPOSITE, STEP, Point, Size
+
+# Seconds of search every frame
+BUDGET = 0.002
+# Free cells behind the next cell that make it safe, even if the tail
+# is not reachable from there
+ROOM = 1024
+UNKNOWN = -1
+# Cells kept between head and tail when the cycle solver takes a
+# shortcut, the tail doesn't move while the snake grows
+MARGIN = 4
+
+
+class Autopilot:
+    """Driver of a snake, through the shortest path to an apple that has
+    room enough.
+
+    Call steer every frame: it searches while there is budget left, and
+    queues a direction once per tick."""
+    __slots__ = ("snake", "board", "budget", "targets", "distances",
+                 "frontier", "head", "hunger", "calls", "decisions",
+                 "searched", "total", "worst")
+
+    def __init__(self, snake: Snake, budget: float = BUDGET):
+        self.snake = snake
+        self.board = snake.board
+        self.budget = budget
+        # Cell indices of the apples, and distance of every cell to them.
+        # Cells in the frontier have their distance, their neighbours
+        # don't yet
+        self.targets = None
+        self.distances = array("l")
+        self.frontier = deque()
+        # Head serial and cell of the last decision, and decisions since
+        # the apples changed
+        self.head = None
+        self.hunger = 0
+        # Calls, decisions and cells searched, and seconds spent
+        self.calls = 0
+        self.decisions = 0
+        self.searched = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def steer(self, targets: List[Point], now: int):
+        """Search a bit more, and queue the best direction for the next
+        tick if not done yet. Parameter targets are the cells of the
+        apples."""
+        start = perf_counter()
+        snake = self.snake
+        if snake.occupancy is None:
+            # A snake alone, with a grid of its own
+            snake.attach(Occupancy(self.board))
+
+        indices = tuple(self.board.pack(pos) for pos in targets)
+        if indices != self.targets:
+            self.aim(indices)
+        head = (snake.serial, snake.cells[-1])
+        deciding = head != self.head
+        # Leave half the budget for the decision, if there is one
+        self.search(start + (self.budget / 2 if deciding else self.budget))
+
+        if deciding:
+            self.head = head
+            self.decisions += 1
+            self.hunger += 1
+            direction = self.choose(start + self.budget)
+            if direction is not None and direction != snake.direction:
+                snake.queue_direction(direction, now)
+
+        elapsed = perf_counter() - start
+        self.calls += 1
+        self.total += elapsed
+        self.worst = max(self.worst, elapsed)
+
+    def aim(self, indices: Tuple[int, ...]):
+        """Start searching distances to new apples."""
+        self.targets = indices
+        self.hunger = 0
+        self.distances = array("l", [UNKNOWN]) * (self.board.cols *
+                                                  self.board.rows)
+        for index in indices:
+            self.distances[index] = 0
+        self.frontier = deque(indices)
+
+    def search(self, deadline: float):
+        """Find distances of more cells, breadth first, until the board
+        is done or the deadline in perf_counter seconds."""
+        cols = self.board.cols
+        size = cols * self.board.rows
+        walls = self.board.walls
+        distances = self.distances
+        frontier = self.frontier
+        count = 0
+        while frontier:
+            # Clock is only checked once in a while, it isn't free
+            if not count & 63 and perf_counter() > deadline:
+                break
+            count += 1
+            index = frontier.popleft()
+            distance = distances[index] + 1
+            row = index - index % cols
+            for neighbour in (row + (index + 1) % cols,
+                              row + (index - 1) % cols,
+                              (index + cols) % size, (index - cols) % size):
+                if distances[neighbour] == UNKNOWN and not (
+                        walls is not None and walls[neighbour]):
+                    distances[neighbour] = distance
+                    frontier.append(neighbour)
+        self.searched += count
+
+    def estimate(self, index: int) -> int:
+        """Return distance of a cell to the closest apple, as the crow
+        flies on a board that wraps around."""
+        cols, rows = self.board.size
+        pos_x, pos_y = index % cols, index // cols
+        return min(
+            min(abs(pos_x - x), cols - abs(pos_x - x)) +
+            min(abs(pos_y - y), rows - abs(pos_y - y))
+            for x, y in (self.board.unpack(target)
+                         for target in self.targets))
+
+    def choose(self, deadline: float) -> Optional[str]:
+        """Return direction to the closest apple that is safe, or to the
+        most room if none is. None if every direction crashes. Room is
+        looked for until the deadline in perf_counter seconds."""
+        snake = self.snake
+        cols, rows = self.board.size
+        cells = snake.occupancy.cells
+        tail = snake.cells[0]
+        # Tail moves away on next tick, unless the snake grows
+        leaving = None if snake.growing else tail
+        head_x, head_y = snake.get_head()
+
+        options = []
+        for direction, (step_x, step_y) in STEP.items():
+            if direction == OPPOSITE[snake.direction]:
+                continue
+            index = ((head_y + step_y) % rows * cols +
+                     (head_x + step_x) % cols)
+            if cells[index] - (index == leaving) > 0:
+                continue
+            distance = self.distances[index]
+            if distance == UNKNOWN and self.frontier:
+                # Not searched yet, it is further than the search went
+                distance = max(self.estimate(index),
+                               self.distances[self.frontier[-1]] + 1)
+            elif distance == UNKNOWN:
+                # No way to the apples from there
+                distance = cols * rows
+            options.append((distance, direction, index))
+        options.sort()
+        if not options:
+            return None
+        if self.hunger > cols * rows:
+            # Apples are out of safe reach for too long, go anyway
+            return options[0][1]
+
+        best, most = None, -1
+        for _, direction, index in options:
+            room = self.room(index, tail, deadline)
+            if room is None:
+                return direction
+            if room > most:
+                best, most = direction, room
+        return best
+
+    def room(self, start: int, tail: int,
+             deadline: float) -> Optional[int]:
+        """Return free cells reachable from a cell, None if the tail is
+        reachable or there are ROOM cells at least, so it is safe to go
+        there: the snake can follow its tail out of anywhere.
+
+        Only cells found until the deadline in perf_counter seconds are
+        counted."""
+        cols = self.board.cols
+        size = cols * self.board.rows
+        cells = self.snake.occupancy.cells
+        seen = {start}
+        stack = [start]
+        count = 0
+        while stack:
+            if not count & 63 and perf_counter() > deadline:
+                break
+            count += 1
+            index = stack.pop()
+            row = index - index % cols
+            for neighbour in (row + (index + 1) % cols,
+                              row + (index - 1) % cols,
+                              (index + cols) % size, (index - cols) % size):
+                if neighbour == tail:
+                    return None
+                if neighbour not in seen and not cells[neighbour]:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+            if len(seen) >= ROOM:
+                return None
+        return len(seen)
+
+    def stats(self) -> Dict[str, float]:
+        """Return decisions, cells searched, and mean and worst time of a
+        call in ms."""
+        return {'decisions': self.decisions,
+                'searched': self.searched,
+                'mean': self.total / self.calls * 1000 if self.calls else 0,
+                'max': self.worst * 1000}
+
+
+@lru_cache(maxsize=8)
+def hamiltonian_cycle(size: Size) -> Tuple[array, array, array]:
+    """Return a Hamiltonian cycle of a board, as flat arrays of cell
+    indices: cells in cycle order, order of every cell in the cycle, and
+    the cell after every cell.
+
+    Rows are crossed back and forth but for the first column, the way
+    back to the first row. With an odd number of rows columns are
+    crossed instead, there is no such cycle if both are odd: raise
+    ValueError."""
+    cols, rows = size
+    order = []
+    if rows % 2 == 0 and cols > 1:
+        for pos_y in range(rows):
+            xs = range(1, cols) if pos_y % 2 == 0 else range(cols - 1, 0, -1)
+            order.extend(pos_y * cols + pos_x for pos_x in xs)
+        order.extend(pos_y * cols for pos_y in range(rows - 1, -1, -1))
+    elif cols % 2 == 0 and rows > 1:
+        for pos_x in range(cols):
+            ys = range(1, rows) if pos_x % 2 == 0 else range(rows - 1, 0, -1)
+            order.extend(pos_y * cols + pos_x for pos_y in ys)
+        order.extend(range(cols - 1, -1, -1))
+    else:
+        raise ValueError(f"no Hamiltonian cycle for a {cols}x{rows} board")
+
+    typecode = "H" if cols * rows <= 1 << 16 else "I"
+    order = array(typecode, order)
+    rank = array(typecode, bytes(order.itemsize * len(order)))
+    successor = array(typecode, rank)
+    for index, cell in enumerate(order):
+        rank[cell] = index
+        successor[cell] = order[(index + 1) % len(order)]
+    return order, rank, successor
+
+
+class CycleSolver:
+    """Driver of a snake that fills the board, along a Hamiltonian cycle.
+
+    Body always lies on the cycle between tail and head, so cells ahead
+    of the head, up to the tail, are free. Shortcuts skip part of them,
+    jumping to a neighbour further along the cycle, but never past the
+    apple or too close to the tail.
+
+    Same interface as Autopilot. Raise ValueError for boards with walls
+    or without a cycle."""
+    __slots__ = ("snake", "board", "order", "rank", "successor", "head",
+                 "decisions", "shortcuts")
+
+    def __init__(self, snake: Snake):
+        if snake.board.walls is not None:
+            raise ValueError("no Hamiltonian cycle for a board with walls")
+        self.snake = snake
+        self.board = snake.board
+        self.order, self.rank, self.successor = hamiltonian_cycle(
+            tuple(snake.board.size))
+        # Head serial and cell of the last decision
+        self.head = None
+        self.decisions = 0
+        self.shortcuts = 0
+
+    def steer(self, targets: List[Point], now: int):
+        """Queue the direction for the next tick if not done yet.
+        Parameter targets are the cells of the apples."""
+        snake = self.snake
+        head = (snake.serial, snake.cells[-1])
+        if head != self.head:
+            self.head = head
+            self.decisions += 1
+            direction = self.choose([self.board.pack(pos)
+                                     for pos in targets])
+            if direction != snake.direction:
+                snake.queue_direction(direction, now)
+
+    def choose(self, targets: List[int]) -> str:
+        """Return direction to the neighbour furthest along the cycle that
+        is safe."""
+        snake = self.snake
+        cols, rows = self.board.size
+        size = cols * rows
+        rank = self.rank
+        head = snake.cells[-1]
+        here = rank[head]
+        # Distances along the cycle, the whole of it if the body is
+        # still in one cell
+        tail = (rank[snake.cells[0]] - here) % size or size
+        limit = tail - MARGIN
+        for target in targets:
+            limit = min(limit, (rank[target] - here) % size)
+        if len(snake) > size // 2:
+            # Cells skipped by shortcuts are behind the head until the
+            # tail goes past them: only the cells ahead are left to grow
+            # into. Keep them all once the board fills up
+            limit = 1
+
+        best, furthest = None, 0
+        closest, nearest = None, size
+        for direction, (step_x, step_y) in STEP.items():
+            if direction == OPPOSITE[snake.direction]:
+                continue
+            cell = ((head // cols + step_y) % rows * cols +
+                    (head % cols + step_x) % cols)
+            ahead = (rank[cell] - here) % size
+            if furthest < ahead <= max(limit, 1):
+                best, furthest = direction, ahead
+            if ahead < nearest:
+                closest, nearest = direction, ahead
+        if best is None:
+            # Only before the first move: the next cell in the cycle is
+            # behind, any other is fine since the body is in one cell
+            return closest
+        if furthest > 1:
+            self.shortcuts += 1
+        return best
+
+    def stats(self) -> Dict[str, float]:
+        """Return decisions and shortcuts taken."""
+        return {'decisions': self.decisions, 'shortcuts': self.shortcuts}
+
+
+def fill(size: Size, seed: int = None) -> Dict[str, float]:
+    """Play a game with the cycle solver until the board is full, as fast
+    as possible and without drawing. Return score, moves, whether the
+    board was filled, and seconds spent."""
+    board = Board(size, pygame.Rect((0, 0), size))
+    board.rng.seed(seed)
+    snake = Snake(board)
+    apple = Apple(snake, board)
+    solver = CycleSolver(snake)
+    moves, full = 0, False
+    start = perf_counter()
+    # Ticks don't matter, but input latency is measured with them
+    while moves < len(solver.order) ** 2:
+        solver.steer([apple.pos], moves)
+        snake.step(moves)
+        moves += 1
+        if snake.check_collision():
+            break
+        if snake.get_head() == apple.pos:
+            snake.growing = True
+            if not apple.new(snake):
+                full = True
+                break
+    return {'score': len(snake) - 1 if full else len(snake) - 2,
+            'moves': moves,
+            'full': full,
+            'seconds': perf_counter() - start}
+
+
+def soak(args: argparse.Namespace):
+    """Play games with the autopilot, one after another, and report how
+    frames and games went."""
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import settings
+    import resources
+    import scores
+    from scenes import SceneGame, SceneVersus
+
+    pygame.init()
+    screen = pygame.display.set_mode((800, 640))
+    resources.load_assets()
+    settings.load_config()
+    scores.load_scores()
+    settings.load_jokes()
+    # Not saved, settings are only written from the settings scene
+    settings.set_settings("board", [int(side)
+                                    for side in args.board.split("x")])
+    settings.set_settings("level", args.level)
+    game = SceneVersus if args.versus else SceneGame
+
+    scene = game.visit()
+    scene.toggle_autopilot()
+    if args.cycle:
+        scene.autopilot = CycleSolver(scene.sneik)
+    scene.sneik.vel = args.speed
+    results = []
+    frames = []
+    frame_ms = 1000 / settings.get_setting("fps")
+    clock = pygame.time.Clock()
+    start = perf_counter()
+    # Game time starts a second in, as after leaving the menu, so the
+    # snake moves on the first frame
+    now = 1000
+    while now < args.seconds * 1000:
+        frame_start = perf_counter()
+        now = 1000 + (len(frames) * frame_ms if args.fast
+                      else (perf_counter() - start) * 1000)
+        pygame.event.pump()
+        scene.update(now)
+        scene.render(screen)
+        if scene.next is not scene:
+            # Game over, play again
+            # Snake didn't crash if the board is full, last apple counts
+            results.append(len(scene.sneik) - (2 if scene.has_crashed else 1))
+            scene.exit()
+            scene = game.visit()
+            scene.sneik.vel = args.speed
+        if not args.headless:
+            pygame.display.flip()
+        frames.append(perf_counter() - frame_start)
+        if not args.fast:
+            clock.tick(settings.get_setting("fps"))
+    pilot = scene.autopilot.stats()
+    pygame.quit()
+
+    frames.sort()
+    print(f"{len(frames)} frames in {perf_counter() - start:.1f} s,"
+          f" mean {sum(frames) / len(frames) * 1000:.2f} ms,"
+          f" 99% {frames[len(frames) * 99 // 100] * 1000:.2f} ms,"
+          f" worst {frames[-1] * 1000:.2f} ms.")
+    if args.cycle:
+        print(f"Cycle solver: {pilot['decisions']} moves,"
+              f" {pilot['shortcuts']} shortcuts.")
+    else:
+        print(f"Autopilot: {pilot['decisions']} moves, {pilot['searched']}"
+              f" cells searched, mean {pilot['mean']:.3f} ms,"
+              f" worst {pilot['max']:.2f} ms.")
+    if results:
+        print(f"{len(results)} games, mean score"
+              f" {sum(results) / len(results):.1f}, best {max(results)}.")
+    print(f"Last game: {len(scene.sneik) - 2} points so far.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--board", default="25x20",
+                        help="board size, like 25x20")
+    parser.add_argument("--level", default="", help="level name")
+    parser.add_argument("--versus", action="store_true",
+                        help="play against bots")
+    parser.add_argument("--seconds", type=float, default=60,
+                        help="game time to play")
+    parser.add_argument("--speed", type=int, default=10,
+                        help="snake moves per second")
+    parser.add_argument("--fast", action="store_true",
+                        help="don't wait between frames, game time runs"
+                        " as fast as frames are done")
+    parser.add_argument("--headless", action="store_true",
+                        help="play without a window")
+    parser.add_argument("--cycle", action="store_true",
+                        help="play with the cycle solver")
+    parser.add_argument("--fill", action="store_true",
+                        help="fill the board with the cycle solver, without"
+                        " a window, and time it")
+    parser.add_argument("--games", type=int, default=10,
+                        help="games to fill")
+    arguments = parser.parse_args()
+    if arguments.fill:
+        board_size = tuple(int(side) for side in arguments.board.split("x"))
+        for game_seed in range(arguments.games):
+            result = fill(board_size, game_seed)
+            print(f"{'Full' if result['full'] else 'Crashed'} at"
+                  f" {result['score']} points, {result['moves']} moves in"
+                  f" {result['seconds']:.3f} s.")
+    else:
+        soak(arguments)
@@ -8,6 +8,21 @@ BLOCK = (32, 32)
 # Size of sprite images in pixels
 SPRITE_BLOCK = (64, 64)
 
+# Board sizes in cells, the board is scaled to fit the screen
+BOARD_SIZES = [(20, 15), (25, 20), (32, 18), (32, 24),
+               (64, 48), (100, 80), (200, 160), (400, 300)]
+
+# Smallest cell size in pixels. Boards that would need smaller cells
+# to fit the screen are bigger than it, and a camera scrolls over them
+MIN_CELL = 16
+
+# Number of highscores shown for each board size
+TOP_SIZE = 5
+
+# Game mode of highscores, alone or against bots
+DEFAULT_MODE = "normal"
+VERSUS_MODE = "versus"
+
 # Types
 Point = NewType('Point', Tuple[int, int])
 Size = NewType('Size', Tuple[int, int])
@@ -19,19 +34,47 @@ WHITE = Color((200, 200, 200))
 BLACK = Color((0, 0, 0))
 BGCOLOR = Color((40, 40, 40))
 SNAKE_COLOR = Color((0, 200, 0))
+BOT_COLOR = Color((0, 120, 200))
+# Bot skins are the snake skin multiplied by this color
+BOT_TINT = Color((110, 150, 255))
+WALL_COLOR = Color((90, 80, 70))
 APPLE_COLOR = Color((200, 0, 0))
 
 # File names
-PUN_FILE = "puns.json"
+PUN_FILE = "puns.txt"
+# Offsets of every pun in PUN_FILE, built from it when missing or stale
+PUN_INDEX = "puns.idx"
 CONFIG_FILE = "settings.json"
+# Obstacle maps, every file is a level named after it
+LEVELS_DIR = "levels"
+SCORES_FILE = "scores.db"
 
 OPPOSITE = {'up': "down", 'down': "up", 'left': "right", 'right': "left"}
+# Cells moved in every direction
+STEP = {'up': (0, -1), 'down': (0, 1), 'left': (-1, 0), 'right': (1, 0)}
+
+# Number of bot snakes in versus mode
+BOT_COUNTS = [1, 3, 7, 15, 31]
+
+# Frame rate modes (fps, pacing). Pacing is 'capped' (clock.tick),
+# 'precise' (clock.tick_busy_loop) or 'uncapped' (fps is ignored)
+FRAME_MODES = [(30, "capped"), (60, "capped"),
+               (30, "precise"), (60, "precise"),
+               (0, "uncapped")]
 
 # Default config
 DEFAULT_SETTINGS = {
     'sound': 1.0,
     'music': 0.8,
-    'classic': False
+    'classic': False,
+    'fps': 60,
+    'pacing': "capped",
+    'board': [25, 20],
+    'bots': 7,
+    # Obstacle map, empty for an open board
+    'level': "",
+    # URL of the online leaderboard, empty to play offline
+    'leaderboard': ""
 }
 DEFAULT_KEYMAPPING = {
     'direction':
@@ -43,6 +86,7 @@ DEFAULT_KEYMAPPING = {
     },
     'grid': pygame.K_g,
     'pause': pygame.K_p,
+    'autopilot': pygame.K_a,
     'exit': pygame.K_ESCAPE,
     'accept': pygame.K_RETURN
 }
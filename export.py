@@ -0,0 +1,191 @@
+"""Export of games as frames, rendered off screen.
+
+A game is played by the autopilot, and every frame is drawn by the
+render methods of the scenes, as on screen, then written as a sequence
+of PNG images or a stream of raw RGB pixels:
+
+    python export.py --board 25x20 --seconds 10 --out clip
+    python export.py --format rgb --out - | ffmpeg -f rawvideo \\
+        -pix_fmt rgb24 -s 800x640 -r 30 -i - clip.mp4
+
+Game time follows the frames, not the clock, and scenes are switched
+like in run_game, so crashes and game over are in the export too. Games
+are the same again with the same seed.
+
+The main process only copies the pixels of every frame, a pool of
+processes converts and encodes them while the game goes on."""
+import os
+import sys
+import random
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import BinaryIO, Optional, Tuple
+
+import pygame
+
+# Surface size, bits per pixel and masks, to rebuild copied pixels
+Layout = Tuple[Tuple[int, int], int, Tuple[int, int, int, int]]
+
+SIZE = (800, 640)
+# Frames waiting in the pool for each process, before waiting for them
+BACKLOG = 4
+
+
+def copy_frame(screen: pygame.Surface) -> bytes:
+    """Return pixels of a surface, as they are in memory."""
+    return screen.get_buffer().raw
+
+
+def get_layout(screen: pygame.Surface) -> Layout:
+    """Return what is needed to rebuild a surface from its pixels."""
+    return (screen.get_size(), screen.get_bitsize(), screen.get_masks())
+
+
+def rebuild(pixels: bytes, layout: Layout) -> pygame.Surface:
+    """Return surface from copied pixels."""
+    size, bitsize, masks = layout
+    surface = pygame.Surface(size, 0, bitsize, masks)
+    surface.get_buffer().write(pixels)
+    return surface
+
+
+def encode_png(pixels: bytes, layout: Layout, path: str) -> int:
+    """Save copied pixels as a PNG image. Return size of the file."""
+    pygame.image.save(rebuild(pixels, layout), path)
+    return os.path.getsize(path)
+
+
+def encode_rgb(pixels: bytes, layout: Layout) -> bytes:
+    """Return copied pixels as raw RGB, 3 bytes per pixel by rows."""
+    return pygame.image.tostring(rebuild(pixels, layout), "RGB")
+
+
+def _finish(future, output: Optional[BinaryIO]) -> int:
+    """Wait for a frame of the pool, and write it to the output, if any.
+    Return bytes written."""
+    result = future.result()
+    if output is None:
+        return result
+    output.write(result)
+    return len(result)
+
+
+def export(args: argparse.Namespace):
+    """Play a game and export its frames."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import settings
+    import resources
+    import scores
+    from scenes import SceneGame, SceneVersus
+    from autopilot import Autopilot, CycleSolver
+
+    pygame.init()
+    screen = pygame.display.set_mode(SIZE)
+    resources.load_assets()
+    settings.load_config()
+    scores.load_scores()
+    settings.load_jokes()
+    # Not saved, settings are only written from the settings scene
+    settings.set_settings("board", [int(side)
+                                    for side in args.board.split("x")])
+    settings.set_settings("level", args.level)
+
+    # Backgrounds are random too
+    random.seed(args.seed)
+    scene = (SceneVersus if args.versus else SceneGame).visit()
+    scene.board.rng.seed(args.seed)
+    scene.reset_board()
+    scene.board.center(scene.sneik.get_head())
+    scene.toggle_autopilot()
+    if args.cycle:
+        scene.autopilot = CycleSolver(scene.sneik)
+    else:
+        # Whole searches, so the game doesn't depend on the machine
+        scene.autopilot = Autopilot(scene.sneik, budget=1.0)
+    scene.sneik.vel = args.speed
+
+    layout = get_layout(screen)
+    output = None
+    if args.format == "png":
+        os.makedirs(args.out, exist_ok=True)
+    elif args.out == "-":
+        output = sys.stdout.buffer
+    else:
+        output = open(args.out, "wb")
+
+    skipped = round(args.start * args.fps)
+    frames = round(args.seconds * args.fps)
+    pending = deque()
+    written = 0
+    waited = 0.0
+    start = perf_counter()
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        for frame in range(skipped + frames):
+            if scene is None:
+                break
+            now = 1000 + frame * 1000 / args.fps
+            pygame.event.pump()
+            scene.update(now)
+            scene.render(screen)
+            if scene.next is not scene:
+                scene.exit()
+            scene = scene.next
+            if frame < skipped:
+                continue
+
+            pixels = copy_frame(screen)
+            if output is None:
+                path = os.path.join(args.out, f"{frame - skipped:06d}.png")
+                pending.append(pool.submit(encode_png, pixels, layout, path))
+            else:
+                pending.append(pool.submit(encode_rgb, pixels, layout))
+            # Don't get too far ahead of the pool, frames take memory
+            if len(pending) > BACKLOG * workers:
+                wait_start = perf_counter()
+                written += _finish(pending.popleft(), output)
+                waited += perf_counter() - wait_start
+        while pending:
+            written += _finish(pending.popleft(), output)
+    elapsed = perf_counter() - start
+    if output is not None and output is not sys.stdout.buffer:
+        output.close()
+    pygame.quit()
+
+    # Frames may go to stdout, report elsewhere
+    print(f"{frames} frames of {layout[0][0]}x{layout[0][1]},"
+          f" {written / 1024 / 1024:.1f} MiB in {elapsed:.1f} s"
+          f" ({frames / elapsed:.0f} fps), {waited:.1f} s waiting for"
+          f" the pool.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--board", default="25x20",
+                        help="board size, like 25x20")
+    parser.add_argument("--level", default="", help="level name")
+    parser.add_argument("--versus", action="store_true",
+                        help="play against bots")
+    parser.add_argument("--cycle", action="store_true",
+                        help="play with the cycle solver")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the game")
+    parser.add_argument("--speed", type=int, default=10,
+                        help="snake moves per second")
+    parser.add_argument("--start", type=float, default=0,
+                        help="game seconds played before the export")
+    parser.add_argument("--seconds", type=float, default=10,
+                        help="game seconds exported")
+    parser.add_argument("--fps", type=int, default=30,
+                        help="frames per game second")
+    parser.add_argument("--format", choices=("png", "rgb"), default="png",
+                        help="PNG images or raw RGB stream")
+    parser.add_argument("--out", default="frames",
+                        help="directory for PNG images, file for the"
+                        " stream, - for stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes encoding frames")
+    export(parser.parse_args())
@@ -5,7 +5,8 @@ from functools import lru_cache
 import pygame
 import pygame.freetype
 
-from consts import Color
+from consts import (Color, Size, BLOCK, SPRITE_BLOCK, WHITE, BLACK,
+                    WALL_COLOR)
 
 
 @lru_cache(maxsize=32)
@@ -77,19 +78,88 @@ def get_surface(size: Tuple[int, int], color: Color,
 
 
 @lru_cache(maxsize=4)
-def build_background(tile: pygame.Surface) -> pygame.Surface:
-    """Return a screen-sized surface filled with a repeated given tile."""
-    # Get screen and tile sizes
-    screen_rect = pygame.display.get_surface().get_rect()
-    screen_size = (screen_rect.w, screen_rect.h)
+def scale_tile(tile: pygame.Surface, cell: Size) -> pygame.Surface:
+    """Return tile scaled as much as cells are scaled from BLOCK size."""
+    if cell == BLOCK:
+        return tile
+    return pygame.transform.scale(
+        tile, (max(1, tile.get_width() * cell[0] // BLOCK[0]),
+               max(1, tile.get_height() * cell[1] // BLOCK[1])))
+
+
+def split_sprites(sheet: pygame.Surface,
+                  cell: Size) -> Tuple[pygame.Surface, pygame.Surface]:
+    """Return apple and snake sprites already resized to cell size.
+
+    Parameter sheet should contain 4x3 sprites, with the apple
+    in the bottom rigth corner."""
+    apple = sheet.subsurface((SPRITE_BLOCK[0] * 3, SPRITE_BLOCK[1] * 2,
+                              SPRITE_BLOCK[0], SPRITE_BLOCK[1]))
+    apple = pygame.transform.scale(apple, (cell[0], cell[1]))
+    snake = sheet
+    snake = pygame.transform.scale(snake, (cell[0]*4, cell[1]*3))
+    return apple, snake
+
+
+@lru_cache(maxsize=4)
+def build_background(tile: pygame.Surface, size: Size,
+                     grid: Size = None) -> pygame.Surface:
+    """Return a surface filled with a repeated tile, one tile bigger than
+    the given size. If grid is a cell size, draw a grid over it.
+
+    Any part of the given size taken from the first tile onwards shows
+    the same pattern, so the background of a scrolling view is a blit of
+    it shifted by the scroll modulo tile size. Tile size must be a
+    multiple of grid cell size for the grid to stay aligned."""
     tile_rect = tile.get_rect()
+    width, height = size[0] + tile_rect.w, size[1] + tile_rect.h
 
-    # Get surface. All arguments need to be hashable
-    surface = get_surface(screen_size, (0, 0, 0), 255)
+    # Own surface, backgrounds of different tiles can't share it
+    surface = pygame.Surface((width, height))
+    surface = surface.convert()
 
     # Fill surface with repeated tile
-    for i in range(0, screen_rect.w, tile_rect.w):
-        for j in range(0, screen_rect.h, tile_rect.h):
+    for i in range(0, width, tile_rect.w):
+        for j in range(0, height, tile_rect.h):
             surface.blit(tile, (i, j))
 
+    # Grid lines, only drawn once here instead of every frame
+    if grid:
+        for i in range(0, width, grid[0]):
+            pygame.draw.line(surface, WHITE, (i, 0), (i, height), 1)
+        for j in range(0, height, grid[1]):
+            pygame.draw.line(surface, WHITE, (0, j), (width, j), 1)
+
     return surface
+
+
+def draw_walls(surface: pygame.Surface, walls: bytearray, board: Size,
+               cell: Size, bevel: bool = True):
+    """Draw walls on a background, one byte per cell counting by rows.
+
+    Background can be bigger than the board, walls are repeated as the
+    board wraps around its edges."""
+    cols, rows = board
+    cell_w, cell_h = cell
+    width, height = surface.get_size()
+    block = pygame.Surface(cell).convert()
+    block.fill(WALL_COLOR)
+    if bevel:
+        # Lit from the top left
+        light = tuple(min(255, c + 40) for c in WALL_COLOR)
+        pygame.draw.line(block, light, (0, 0), (cell_w - 1, 0))
+        pygame.draw.line(block, light, (0, 0), (0, cell_h - 1))
+        pygame.draw.line(block, BLACK, (0, cell_h - 1),
+                         (cell_w - 1, cell_h - 1))
+        pygame.draw.line(block, BLACK, (cell_w - 1, 0),
+                         (cell_w - 1, cell_h - 1))
+
+    blits = []
+    for index, wall in enumerate(walls):
+        if not wall:
+            continue
+        pos_x, pos_y = index % cols * cell_w, index // cols * cell_h
+        for left in range(pos_x, width, cols * cell_w):
+            for top in range(pos_y, height, rows * cell_h):
+                blits.append((block, (left, top)))
+    surface.blits(blits, False)
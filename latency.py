@@ -0,0 +1,171 @@
+"""Measure latency from a direction key press to the frame showing it.
+
+Instrumentation is off unless enabled. When on, every direction event is
+tagged with the time it was pressed (or posted), and followed through
+Snake.queue_direction, Snake.move and the render flipped to the screen.
+
+Run this module to benchmark it headless, with synthetic key events
+posted through pygame.event.post:
+
+    python latency.py --inputs 200 --fps 60 --pacing capped
+"""
+import os
+import random
+import argparse
+from time import perf_counter
+from collections import deque
+from typing import Any, Dict, List
+
+import pygame
+
+enabled = False
+# Tags (press time, queued time) of inputs waiting in the buffer
+queued = deque()
+# Tags (press time, queued time, moved time) waiting for the flip
+moved = []
+# Finished samples (press, queued, moved, flipped), in ms
+samples = []
+
+
+def timestamp() -> float:
+    """Return a precise timestamp in ms."""
+    return perf_counter() * 1000
+
+
+def enable():
+    """Start measuring, discarding previous samples."""
+    global enabled
+
+    enabled = True
+    queued.clear()
+    moved.clear()
+    samples.clear()
+
+
+def tag(event: pygame.event.EventType) -> Any:
+    """Return the tag of a direction event, None if not measuring.
+
+    Synthetic events carry the time they were posted in 'stamp'."""
+    if not enabled:
+        return None
+    return getattr(event, "stamp", timestamp())
+
+
+def track_queued(stamp: float):
+    """Input entered the direction buffer."""
+    queued.append((stamp, timestamp()))
+
+
+def track_moved(stamp: float):
+    """Snake moved using the input with this tag."""
+    while queued:
+        pressed, when = queued.popleft()
+        # Inputs dropped by a reset never move, skip them
+        if pressed == stamp:
+            moved.append((pressed, when, timestamp()))
+            break
+
+
+def track_flipped():
+    """A frame was flipped, it shows every input moved so far."""
+    if moved:
+        flipped = timestamp()
+        samples.extend((*tags, flipped) for tags in moved)
+        moved.clear()
+
+
+def report() -> Dict[str, Dict[str, float]]:
+    """Return latency distribution, total and by stage.
+
+    Stages are 'queue' (press to buffer), 'wait' (buffer to move) and
+    'frame' (move to flip)."""
+    stages = {'total': [s[3] - s[0] for s in samples],
+              'queue': [s[1] - s[0] for s in samples],
+              'wait': [s[2] - s[1] for s in samples],
+              'frame': [s[3] - s[2] for s in samples]}
+    return {name: _distribution(values) for name, values in stages.items()}
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    """Return count, mean, percentiles and max of a list of values."""
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+    last = len(values) - 1
+    return {'count': len(values),
+            'mean': sum(values) / len(values),
+            'p50': values[last // 2],
+            'p95': values[last * 95 // 100],
+            'p99': values[last * 99 // 100],
+            'max': values[last]}
+
+
+def benchmark(inputs: int, fps: int, pacing: str, interval: int):
+    """Play headless posting direction keys, then print the report."""
+    os.environ['SDL_VIDEODRIVER'] = "dummy"
+    os.environ['SDL_AUDIODRIVER'] = "dummy"
+    import settings
+    from snake import run_game
+    from scenes import SceneGame
+
+    # Statistics of the direction buffer of the snake, at the end
+    buffered = {}
+
+    class SceneProbe(SceneGame):
+        """Game scene that presses keys by itself and replays on crash."""
+
+        def enter(self):
+            super().enter()
+            settings.set_settings("fps", fps)
+            settings.set_settings("pacing", pacing)
+            self.posted = 0
+            self.post_at = 0
+
+        def update(self, now: int):
+            if now >= self.post_at and not self.has_crashed:
+                # Staircase never reverses nor bites a short snake
+                direction = ("up", "right")[self.posted % 2]
+                pygame.event.post(pygame.event.Event(
+                    pygame.KEYDOWN, key=settings.get_key(direction),
+                    mod=0, unicode="", stamp=timestamp()))
+                self.posted += 1
+                # Random phase against the frame clock
+                self.post_at = now + random.uniform(0.75, 1.25) * interval
+            super().update(now)
+            if len(samples) >= inputs:
+                # Scenes are reused, so is the snake and its buffer
+                buffered.update(self.sneik.direction_queue.stats())
+                self.terminate()
+            elif self.has_crashed:
+                # Replay right away instead of going to game over
+                self.switch_to_scene(SceneProbe)
+
+    enable()
+    run_game(800, 640, SceneProbe)
+    pygame.quit()
+
+    print(f"Input to display latency, {fps} fps {pacing} (ms)")
+    for stage, dist in report().items():
+        values = ", ".join(f"{k} {v:.1f}" for k, v in dist.items()
+                           if k != "count")
+        print(f"{stage:>6}: n={dist['count']} {values}")
+    # Buffer measures from press to move, on the game clock
+    values = ", ".join(f"{k} {v:.1f}" for k, v in buffered.items()
+                       if k not in ("count", "dropped"))
+    print(f"buffer: n={buffered.get('count', 0)}"
+          f" dropped={buffered.get('dropped', 0)} {values}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inputs", type=int, default=200,
+                        help="direction changes to measure")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--pacing", default="capped",
+                        choices=["capped", "precise", "uncapped"])
+    parser.add_argument("--interval", type=int, default=150,
+                        help="mean ms between key presses")
+    args = parser.parse_args()
+    # Game modules import this one as 'latency', not as '__main__'
+    import latency
+    latency.benchmark(args.inputs, args.fps, args.pacing, args.interval)
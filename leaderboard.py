@@ -0,0 +1,164 @@
+"""Online leaderboard client.
+
+New highscores wait in the outbox of the highscore database and are
+sent in batches by a background thread, over one keep-alive connection.
+The game loop never waits for the network: it only wakes the thread
+up. Scores that can't be sent stay in the outbox for the next try, or
+the next time the game is started. Batches the server refuses as bad
+leave the outbox, they would be refused again; the highscores are still
+in the local table."""
+import json
+import sqlite3
+import threading
+import http.client
+from time import monotonic
+from urllib.parse import urlsplit
+from typing import Dict, List
+
+from consts import SCORES_FILE
+
+# Highscores sent in every request
+BATCH = 50
+# Seconds to wait before trying again after an error, doubled every
+# error up to MAX_RETRY_DELAY
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+TIMEOUT = 10.0
+# Client errors worth trying again, the rest refuse the batch for good
+RETRY_STATUS = (408, 429)
+
+worker = None
+wake = threading.Event()
+running = False
+stats = {'sent': 0, 'rejected': 0, 'requests': 0, 'errors': 0,
+         'connections': 0}
+
+
+class Rejected(http.client.HTTPException):
+    """Server refused a batch, sending it again won't help."""
+
+
+# GETS ======================================================================
+def get_stats() -> Dict[str, int]:
+    """Return number of highscores sent and rejected, requests, errors
+    and connections opened."""
+    return dict(stats)
+
+
+def _read_outbox(connection: sqlite3.Connection) -> List[Dict]:
+    """Return the oldest highscores waiting to be sent."""
+    rows = connection.execute(
+        "SELECT outbox.uid, scores.board, scores.mode, scores.name,"
+        " scores.score, scores.date FROM outbox"
+        " JOIN scores ON scores.id = outbox.score_id"
+        " ORDER BY outbox.score_id LIMIT ?", (BATCH,))
+    return [dict(zip(("uid", "board", "mode", "name", "score", "date"), row))
+            for row in rows]
+
+
+# SETS ======================================================================
+def notify():
+    """Tell the client there are new highscores in the outbox."""
+    wake.set()
+
+
+def start(url: str):
+    """Start sending highscores to the leaderboard at url, like
+    'http://localhost:8642'."""
+    global worker
+    global running
+
+    if worker is not None:
+        return
+    running = True
+    wake.set()  # Send what previous games left in the outbox
+    worker = threading.Thread(target=_run, args=(url,),
+                              name="leaderboard", daemon=True)
+    worker.start()
+
+
+def stop(timeout: float = 1.0):
+    """Stop the client, waiting a bit for a request in progress.
+
+    Unsent highscores stay in the outbox."""
+    global worker
+    global running
+
+    if worker is None:
+        return
+    running = False
+    wake.set()
+    worker.join(timeout)
+    worker = None
+
+
+# NETWORK ===================================================================
+def _connect(url: str) -> http.client.HTTPConnection:
+    """Return a connection to the server, it opens on first request."""
+    parts = urlsplit(url)
+    if parts.scheme == "https":
+        return http.client.HTTPSConnection(parts.netloc, timeout=TIMEOUT)
+    return http.client.HTTPConnection(parts.netloc, timeout=TIMEOUT)
+
+
+def _submit(conn: http.client.HTTPConnection, path: str,
+            batch: List[Dict]):
+    """Send a batch of highscores, raise an exception if not accepted,
+    Rejected if it never will be."""
+    body = json.dumps({'scores': batch}).encode("utf8")
+    conn.request("POST", path, body,
+                 {'Content-Type': "application/json"})
+    response = conn.getresponse()
+    # Read the whole answer, so the connection can be used again
+    response.read()
+    if 400 <= response.status < 500 and \
+            response.status not in RETRY_STATUS:
+        raise Rejected(f"status {response.status}")
+    if not 200 <= response.status < 300:
+        raise http.client.HTTPException(f"status {response.status}")
+
+
+def _run(url: str):
+    """Send highscores in the outbox until the client is stopped."""
+    connection = sqlite3.connect(SCORES_FILE)
+    path = (urlsplit(url).path or "").rstrip("/") + "/scores"
+    conn = None
+    delay = RETRY_DELAY
+    while running:
+        wake.clear()
+        batch = _read_outbox(connection)
+        if not batch:
+            wake.wait()
+            continue
+
+        if conn is None:
+            conn = _connect(url)
+            stats['connections'] += 1
+        try:
+            stats['requests'] += 1
+            _submit(conn, path, batch)
+        except Rejected:
+            stats['rejected'] += len(batch)
+        except (EnvironmentError, http.client.HTTPException):
+            # Server is down or busy, try again later with a new
+            # connection
+            stats['errors'] += 1
+            conn.close()
+            conn = None
+            # New highscores wake the thread up, but don't end the wait
+            deadline = monotonic() + delay
+            while running and monotonic() < deadline:
+                wake.wait(deadline - monotonic())
+                wake.clear()
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+            continue
+        else:
+            stats['sent'] += len(batch)
+
+        delay = RETRY_DELAY
+        with connection:
+            connection.executemany("DELETE FROM outbox WHERE uid = ?",
+                                   ((entry['uid'],) for entry in batch))
+    if conn is not None:
+        conn.close()
+    connection.close()
@@ -0,0 +1,123 @@
+"""Reference leaderboard server, to test the online leaderboard locally.
+
+    python leaderboard_server.py --port 8642
+
+Then set "leaderboard": "http://localhost:8642" in settings.json.
+
+POST /scores with {"scores": [...]} adds highscores, the ones already
+received (same uid) are ignored. GET /scores?board=25x20&mode=normal
+returns the top of a board size and mode."""
+import json
+import sqlite3
+import argparse
+import threading
+from socketserver import ThreadingMixIn
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from consts import TOP_SIZE, DEFAULT_MODE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL UNIQUE,
+    board TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_top
+    ON scores (board, mode, score DESC, date);
+"""
+FIELDS = ("uid", "board", "mode", "name", "score", "date")
+
+
+class LeaderboardServer(ThreadingMixIn, HTTPServer):
+    """HTTP server with a thread per connection, sharing one database."""
+    daemon_threads = True
+
+    def __init__(self, address: tuple, database: str):
+        super().__init__(address, LeaderboardHandler)
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+
+class LeaderboardHandler(BaseHTTPRequestHandler):
+    """Handle requests, keeping connections alive between them."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        """Add a batch of highscores."""
+        if urlsplit(self.path).path != "/scores":
+            self.send_json(404, {'error': "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            entries = json.loads(self.rfile.read(length).decode("utf8"))
+            rows = [tuple(entry[field] for field in FIELDS)
+                    for entry in entries['scores']]
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {'error': "bad request"})
+            return
+
+        with self.server.lock, self.server.connection as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO scores"
+                " (uid, board, mode, name, score, date)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows)
+            accepted = connection.total_changes - before
+        self.send_json(200, {'accepted': accepted})
+
+    def do_GET(self):
+        """Return the top of a board size and mode."""
+        url = urlsplit(self.path)
+        if url.path != "/scores":
+            self.send_json(404, {'error': "not found"})
+            return
+        query = parse_qs(url.query)
+        board = query.get("board", ["25x20"])[0]
+        mode = query.get("mode", [DEFAULT_MODE])[0]
+        try:
+            count = int(query.get("count", [TOP_SIZE])[0])
+        except ValueError:
+            self.send_json(400, {'error': "bad request"})
+            return
+
+        with self.server.lock:
+            rows = self.server.connection.execute(
+                "SELECT name, score, date FROM scores"
+                " WHERE board = ? AND mode = ?"
+                " ORDER BY score DESC, date, id LIMIT ?",
+                (board, mode, count)).fetchall()
+        self.send_json(200, {'scores': [
+            {'name': name, 'score': score, 'date': date}
+            for name, score, date in rows]})
+
+    def send_json(self, status: int, data: dict):
+        """Send an answer, with its length so the connection stays
+        open."""
+        body = json.dumps(data).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8642)
+    parser.add_argument("--db", default="leaderboard.db",
+                        help="database file")
+    args = parser.parse_args()
+    server = LeaderboardServer((args.host, args.port), args.db)
+    print(f"Leaderboard on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
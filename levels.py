@@ -0,0 +1,98 @@
+"""Obstacle maps, loaded from level files.
+
+A level file is a text file in LEVELS_DIR, named after the level. Lines
+starting with ';' are comments, the first line left is the board size,
+and every line after it is a row of the board, run length encoded:
+
+    ; A box
+    25 20
+    25#
+    #23.#
+    ...
+
+'#' is a wall and '.' is free, with an optional count before them.
+Missing cells and rows are free."""
+import os
+import re
+from typing import List, Optional, Tuple
+
+from consts import LEVELS_DIR, Size
+
+EXTENSION = ".txt"
+RUN = re.compile(r"(\d*)([#.])")
+
+
+def get_levels(size: Size) -> List[str]:
+    """Return names of the levels for a board size, sorted."""
+    names = []
+    try:
+        files = sorted(os.listdir(LEVELS_DIR))
+    except EnvironmentError:
+        return names
+    for file_name in files:
+        name, extension = os.path.splitext(file_name)
+        if extension == EXTENSION and _read_size(name) == tuple(size):
+            names.append(name)
+    return names
+
+
+def _path(name: str) -> str:
+    """Return file name of a level."""
+    return os.path.join(LEVELS_DIR, name + EXTENSION)
+
+
+def _lines(name: str) -> List[str]:
+    """Return lines of a level file, without comments."""
+    with open(_path(name), "r", encoding="utf-8") as file_p:
+        return [line.strip() for line in file_p
+                if not line.startswith(";")]
+
+
+def _read_size(name: str) -> Optional[Size]:
+    """Return board size of a level, None if it can't be read. Only the
+    beginning of the file is read."""
+    try:
+        with open(_path(name), "r", encoding="utf-8") as file_p:
+            for line in file_p:
+                if not line.startswith(";"):
+                    cols, rows = line.split()
+                    return (int(cols), int(rows))
+    except (EnvironmentError, ValueError):
+        pass
+    return None
+
+
+def parse_level(lines: List[str]) -> Tuple[Size, bytearray]:
+    """Return board size and walls of a level, one byte per cell counting
+    by rows, 1 for walls.
+
+    Raise ValueError if the level is malformed."""
+    cols, rows = (int(side) for side in lines[0].split())
+    walls = bytearray(cols * rows)
+    for pos_y, line in enumerate(lines[1:rows + 1]):
+        pos_x = 0
+        for count, cell in RUN.findall(line):
+            count = int(count) if count else 1
+            if pos_x + count > cols:
+                raise ValueError(f"row {pos_y} is longer than {cols} cells")
+            if cell == "#":
+                start = pos_y * cols + pos_x
+                walls[start:start + count] = b"\x01" * count
+            pos_x += count
+    if walls.count(0) == 0:
+        raise ValueError("there are no free cells")
+    return (cols, rows), walls
+
+
+def load_level(name: str, size: Size) -> Optional[bytearray]:
+    """Return walls of a level, None if it can't be loaded or it is not
+    made for the given board size."""
+    try:
+        level_size, walls = parse_level(_lines(name))
+    except (EnvironmentError, ValueError, IndexError):
+        print(f"Error: couldn't load level {name}.")
+        return None
+    if level_size != tuple(size):
+        print(f"Error: level {name} is not for a {size[0]}x{size[1]} board.")
+        return None
+    return walls
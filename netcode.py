@@ -0,0 +1,469 @@
+"""Online play, over asyncio in a thread beside the game loop.
+
+The game loop never waits for the network: messages from the server are
+decoded in the network thread and picked up once a frame, and inputs are
+handed to the network thread to be sent.
+
+There are two modes:
+- lockstep: the server only relays the inputs of every player, once a
+  tick, and every client plays the same game from them. Random choices
+  come from a generator seeded by the server.
+- authoritative: the server plays the game and sends what changed since
+  the last tick each client acknowledged: new pieces of every snake,
+  and how long it is, so removed pieces are implied.
+
+Run a local server stand-in, then a client for every player:
+
+    python netcode.py server --players 2 --mode lockstep
+    python netcode.py client --host localhost
+"""
+import random
+import struct
+import argparse
+import threading
+import asyncio
+from time import perf_counter
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+import pygame
+
+import levels
+from objects import Board, Apple, Snake, Occupancy
+from consts import Size
+
+PORT = 8765
+# Game pace, Snake.vel moves per second
+TICK_MS = 100
+LOCKSTEP = 0
+AUTHORITATIVE = 1
+MODES = {'lockstep': LOCKSTEP, 'authoritative': AUTHORITATIVE}
+# Ticks kept to compute snapshots against, older acks get full bodies
+HISTORY = 64
+# Inputs waiting for the next ticks, for every player
+INPUT_BUFFER = 3
+
+# Struct format of the size before every message, and its bytes
+HEADER = "!I"
+HEADER_SIZE = struct.calcsize(HEADER)
+# Message types. Every message is its size and its type
+HELLO = b"H"
+WELCOME = b"W"
+INPUT = b"I"
+TICK = b"T"
+SNAPSHOT = b"S"
+ACK = b"A"
+PING = b"P"
+PONG = b"Q"
+NO_INPUT = 255
+
+# Client state, the network thread owns the connection
+loop = None
+worker = None
+task = None
+writer = None
+# Decoded messages from the server, oldest first
+inbox = deque()
+# Round trip times, in ms
+rtts = deque(maxlen=64)
+stats = {'bytes_in': 0, 'bytes_out': 0, 'in_rate': 0.0, 'out_rate': 0.0,
+         'rtt': 0.0}
+
+
+def cell_format(size: Size) -> str:
+    """Return struct format of a cell index, same as board arrays."""
+    return "H" if size[0] * size[1] <= 1 << 16 else "I"
+
+
+def frame(payload: bytes) -> bytes:
+    """Return a message ready to be sent, after its length."""
+    return struct.pack(HEADER, len(payload)) + payload
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    """Return next message, raise IncompleteReadError if closed."""
+    size, = struct.unpack(HEADER, await reader.readexactly(HEADER_SIZE))
+    return await reader.readexactly(size)
+
+
+class Arena:
+    """Snakes of every player on a shared board, moved a tick at a time.
+
+    Collisions are found through an occupancy grid, like versus mode, and
+    crashed snakes are born again somewhere else. Random choices come
+    from the board generator, so every client seeded the same way plays
+    the same game from the same inputs."""
+
+    def __init__(self, board: Board, players: int, seed: int):
+        board.rng.seed(seed)
+        self.board = board
+        self.grid = Occupancy(board)
+        self.ticks = 0
+        self.snakes = [Snake(board) for _ in range(players)]
+        # Times every snake was born again
+        self.lives = [0] * players
+        for snake in self.snakes:
+            self.spawn(snake)
+        self.apples = [Apple(self.grid, board)
+                       for _ in range(1 + players // 4)]
+
+    def spawn(self, snake: Snake):
+        """Put a snake in a free cell of the board."""
+        snake.detach()
+        while True:
+            snake.reset()
+            if snake.get_head() not in self.grid:
+                break
+        snake.attach(self.grid)
+
+    def tick(self, inputs: List[Optional[str]]) -> List[int]:
+        """Move every snake, turning to its input if any. Return players
+        whose snake crashed."""
+        self.ticks += 1
+        now = self.ticks * TICK_MS
+        for snake, direction in zip(self.snakes, inputs):
+            if direction is not None:
+                snake.queue_direction(direction, now)
+            snake.step(now)
+
+        apples = {apple.pos: apple for apple in self.apples}
+        for snake in self.snakes:
+            apple = apples.get(snake.get_head())
+            if apple is not None:
+                snake.growing = True
+                apple.new(self.grid)
+
+        # Only once every snake moved
+        crashed = [player for player, snake in enumerate(self.snakes)
+                   if snake.check_crowded()]
+        for player in crashed:
+            self.lives[player] += 1
+            self.spawn(self.snakes[player])
+        return crashed
+
+
+# CLIENT ====================================================================
+def connect(host: str, port: int = PORT):
+    """Connect to a server, in a new thread."""
+    global loop
+    global worker
+    global task
+
+    inbox.clear()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(_client(host, port))
+    worker = threading.Thread(target=_run_client, name="netcode",
+                              daemon=True)
+    worker.start()
+
+
+def disconnect():
+    """Close the connection, if any."""
+    global worker
+
+    if worker is None:
+        return
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(task.cancel)
+    worker.join(1.0)
+    worker = None
+
+
+def receive() -> List[Tuple]:
+    """Return messages received since last call, oldest first."""
+    messages = []
+    while inbox:
+        messages.append(inbox.popleft())
+    return messages
+
+
+def send_input(direction: str):
+    """Send a direction change, it is applied on a coming tick."""
+    _send(INPUT + bytes([Snake.CODES[direction]]))
+
+
+def send_ack(tick: int):
+    """Tell the server the snapshot of a tick was applied."""
+    _send(ACK + struct.pack("!I", tick))
+
+
+def get_stats() -> dict:
+    """Return bytes sent and received, their rates in bytes per second,
+    and the last and mean round trip times in ms."""
+    result = dict(stats)
+    result['rtt_mean'] = sum(rtts) / len(rtts) if rtts else 0.0
+    return result
+
+
+def _send(payload: bytes):
+    """Queue a message to be sent by the network thread."""
+    if worker is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(_write, payload)
+
+
+def _write(payload: bytes):
+    """Send a message, from the network thread."""
+    if writer is not None:
+        message = frame(payload)
+        stats['bytes_out'] += len(message)
+        writer.write(message)
+
+
+def _run_client():
+    """Run the client until it is disconnected."""
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        pass
+    loop.close()
+
+
+async def _client(host: str, port: int):
+    """Receive messages from the server, decoding them for the game."""
+    global writer
+
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as error:
+        inbox.append(("error", str(error)))
+        return
+    _write(HELLO)
+    pinger = asyncio.ensure_future(_ping())
+    fmt = "H"
+    try:
+        while True:
+            payload = await read_message(reader)
+            stats['bytes_in'] += len(payload) + HEADER_SIZE
+            kind, body = payload[:1], payload[1:]
+            if kind == WELCOME:
+                mode, player, players, cols, rows, seed = struct.unpack(
+                    "!BBBHHI", body[:11])
+                fmt = cell_format((cols, rows))
+                inbox.append(("welcome", mode, player, players,
+                              (cols, rows), seed, body[11:].decode("utf8")))
+            elif kind == TICK:
+                tick, = struct.unpack("!I", body[:4])
+                inbox.append(("tick", tick, list(body[4:])))
+            elif kind == SNAPSHOT:
+                inbox.append(("snapshot",) + decode_snapshot(body, fmt))
+            elif kind == PONG:
+                sent, = struct.unpack("!d", body)
+                stats['rtt'] = (perf_counter() - sent) * 1000
+                rtts.append(stats['rtt'])
+    except (asyncio.IncompleteReadError, OSError):
+        inbox.append(("closed",))
+    finally:
+        pinger.cancel()
+        writer.close()
+        writer = None
+
+
+async def _ping():
+    """Measure round trip time and bandwidth every second."""
+    last_in, last_out, last_time = 0, 0, perf_counter()
+    while True:
+        _write(PING + struct.pack("!d", perf_counter()))
+        await asyncio.sleep(1)
+        now = perf_counter()
+        stats['in_rate'] = (stats['bytes_in'] - last_in) / (now - last_time)
+        stats['out_rate'] = ((stats['bytes_out'] - last_out) /
+                             (now - last_time))
+        last_in, last_out, last_time = (stats['bytes_in'],
+                                        stats['bytes_out'], now)
+
+
+def encode_snapshot(arena: Arena, tick: int,
+                    base: Optional[List[Tuple[int, int]]]) -> bytes:
+    """Return what changed in the arena since a previous state.
+
+    Parameter base is the (life, head serial) of every snake at the
+    acknowledged tick, None to send whole bodies."""
+    fmt = cell_format(arena.board.size)
+    parts = [SNAPSHOT, struct.pack("!IB", tick, len(arena.apples)),
+             struct.pack(f"!{len(arena.apples)}{fmt}",
+                         *(arena.board.pack(apple.pos)
+                           for apple in arena.apples))]
+    for player, snake in enumerate(arena.snakes):
+        length = len(snake)
+        count = length
+        if base is not None and base[player][0] == arena.lives[player]:
+            count = min(length, snake.serial - base[player][1])
+        parts.append(struct.pack("!HIII", arena.lives[player] & 0xFFFF,
+                                 snake.serial, length, count))
+        parts.append(struct.pack(f"!{count}{fmt}",
+                                 *snake.cells[length - count:]))
+        parts.append(bytes(snake.directions[length - count:]))
+    return b"".join(parts)
+
+
+def decode_snapshot(body: bytes, fmt: str) -> Tuple[int, List[int], List]:
+    """Return tick, apple cells and (life, head serial, length, cells,
+    directions) of every snake in a snapshot."""
+    size = struct.calcsize(fmt)
+    tick, count = struct.unpack("!IB", body[:5])
+    offset = 5 + count * size
+    apples = list(struct.unpack(f"!{count}{fmt}", body[5:offset]))
+    snakes = []
+    while offset < len(body):
+        life, serial, length, count = struct.unpack(
+            "!HIII", body[offset:offset + 14])
+        offset += 14
+        cells = struct.unpack(f"!{count}{fmt}",
+                              body[offset:offset + count * size])
+        offset += count * size
+        directions = body[offset:offset + count]
+        offset += count
+        snakes.append((life, serial, length, cells, directions))
+    return tick, apples, snakes
+
+
+# SERVER ====================================================================
+class Server:
+    """Local stand-in of an online server.
+
+    The game starts once every player joined. In authoritative mode
+    players can join again after leaving, they get whole bodies first."""
+
+    def __init__(self, players: int, mode: int, size: Size, level: str = "",
+                 seed: int = None):
+        self.players = players
+        self.mode = mode
+        self.size = tuple(size)
+        self.level = level
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.tick = 0
+        self.started = False
+        self.ready = None
+        # Writers and last acknowledged tick by player
+        self.clients = {}
+        self.acked = {}
+        self.inputs = [deque(maxlen=INPUT_BUFFER) for _ in range(players)]
+        self.bytes_out = 0
+        # (life, head serial) of every snake in recent ticks
+        self.history = {}
+        self.arena = None
+        if mode == AUTHORITATIVE:
+            walls = levels.load_level(level, size) if level else None
+            board = Board(self.size, pygame.Rect(0, 0, *self.size), walls)
+            self.arena = Arena(board, players, self.seed)
+
+    async def serve(self, host: str, port: int):
+        """Accept players and run the game."""
+        self.ready = asyncio.Event()
+        await asyncio.start_server(self.handle, host, port)
+        print(f"Waiting for {self.players} players on {host}:{port}...")
+        await self.ready.wait()
+        self.started = True
+        print("Game started.")
+        await self.run()
+
+    def send(self, player: int, payload: bytes):
+        """Send a message to a player."""
+        message = frame(payload)
+        self.bytes_out += len(message)
+        self.clients[player].write(message)
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        """Talk to a player until it leaves."""
+        player = None
+        try:
+            if await read_message(reader) != HELLO:
+                return
+            free = sorted(set(range(self.players)) - set(self.clients))
+            if not free or (self.started and self.mode == LOCKSTEP):
+                return
+            player = free[0]
+            self.clients[player] = writer
+            self.acked[player] = None
+            self.send(player, WELCOME + struct.pack(
+                "!BBBHHI", self.mode, player, self.players, *self.size,
+                self.seed) + self.level.encode("utf8"))
+            print(f"Player {player + 1} joined.")
+            if len(self.clients) == self.players:
+                self.ready.set()
+
+            while True:
+                payload = await read_message(reader)
+                kind, body = payload[:1], payload[1:]
+                if kind == INPUT and body[0] < len(Snake.DIRECTIONS):
+                    self.inputs[player].append(body[0])
+                elif kind == ACK:
+                    tick, = struct.unpack("!I", body)
+                    self.acked[player] = max(tick, self.acked[player] or 0)
+                elif kind == PING:
+                    self.send(player, PONG + body)
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        finally:
+            if player is not None:
+                del self.clients[player]
+                print(f"Player {player + 1} left.")
+            writer.close()
+
+    async def run(self):
+        """Send a tick to every player at a steady pace."""
+        event_loop = asyncio.get_event_loop()
+        next_tick = event_loop.time()
+        while True:
+            next_tick += TICK_MS / 1000
+            await asyncio.sleep(max(0, next_tick - event_loop.time()))
+            self.tick += 1
+            codes = [queue.popleft() if queue else NO_INPUT
+                     for queue in self.inputs]
+
+            if self.mode == LOCKSTEP:
+                payload = TICK + struct.pack("!I", self.tick) + bytes(codes)
+                for player in list(self.clients):
+                    self.send(player, payload)
+                continue
+
+            self.arena.tick([Snake.DIRECTIONS[code] if code != NO_INPUT
+                             else None for code in codes])
+            self.history[self.tick] = [
+                (life, snake.serial) for life, snake
+                in zip(self.arena.lives, self.arena.snakes)]
+            self.history.pop(self.tick - HISTORY, None)
+            for player in list(self.clients):
+                base = self.history.get(self.acked[player])
+                self.send(player, encode_snapshot(self.arena, self.tick,
+                                                  base))
+
+
+def run_server(args: Any):
+    """Run a server until interrupted."""
+    size = tuple(int(side) for side in args.board.split("x"))
+    server = Server(args.players, MODES[args.mode], size, args.level,
+                    args.seed)
+    event_loop = asyncio.get_event_loop()
+    try:
+        event_loop.run_until_complete(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    print(f"{server.tick} ticks, {server.bytes_out} bytes sent.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("role", choices=["server", "client"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--mode", default="lockstep", choices=list(MODES))
+    parser.add_argument("--board", default="25x20",
+                        help="board size, like 25x20")
+    parser.add_argument("--level", default="", help="level name")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.role == "server":
+        run_server(args)
+    else:
+        # Game modules import this one as 'netcode', not as '__main__'
+        import netcode
+        import scenes
+        from snake import run_game
+        netcode.connect(args.host, args.port)
+        run_game(800, 640, scenes.SceneOnline)
+        netcode.disconnect()
+        pygame.quit()
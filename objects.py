@@ -1,169 +1,660 @@
 """Objects of the game."""
 import math
-import queue
 import random
-from typing import Dict, Tuple
+from array import array
+from collections import deque
+from typing import (Any, Dict, Iterable, Iterator, List, Optional, Tuple,
+                    Union)
 
 import pygame
 
-from consts import (SnakeBody, BLOCK, APPLE_COLOR,
-                    WHITE, SNAKE_COLOR, OPPOSITE)
+import latency
+from consts import (SnakeBody, Point, Size, APPLE_COLOR, MIN_CELL,
+                    WHITE, BGCOLOR, SNAKE_COLOR, OPPOSITE, STEP)
+
+
+class Board:
+    """Playing field. Its size is in cells, and it is scaled to fit
+    the given area of the screen.
+
+    If cells would be smaller than MIN_CELL, only part of the board
+    is shown, the view, and a camera scrolls over it. Board wraps around
+    its edges, so the view does too.
+
+    Walls, if any, are a byte per cell counting by rows, 1 for walls.
+    Free cells are listed once, so random cells are picked right away
+    however much of the board is walls.
+
+    Every random choice on the board comes from its own generator, so a
+    seeded board plays the same game again."""
+    __slots__ = ("size", "cols", "rows", "cell", "view", "scrolls",
+                 "origin", "rect", "typecode", "walls", "free", "rng")
+
+    def __init__(self, size: Size, area: pygame.Rect,
+                 walls: bytearray = None):
+        self.size = size
+        self.cols, self.rows = size
+        # Array type big enough for cell indices
+        self.typecode = "H" if self.cols * self.rows <= 1 << 16 else "I"
+        self.rng = random.Random()
+        self.walls = walls
+        self.free = None
+        if walls is not None:
+            self.free = array(self.typecode,
+                              (i for i, wall in enumerate(walls) if not wall))
+        side = max(MIN_CELL, min(area.w // self.cols, area.h // self.rows))
+        self.cell = (side, side)
+        self.view = (min(self.cols, area.w // side),
+                     min(self.rows, area.h // side))
+        self.scrolls = self.view != self.size
+        # Top left cell in the view, it is the camera position
+        self.origin = (0, 0)
+        self.rect = pygame.Rect(0, 0, self.view[0] * side,
+                                self.view[1] * side)
+        self.rect.center = area.center
+
+    def center(self, pos: Point):
+        """Move camera so the given cell is in the middle of the view."""
+        if self.scrolls:
+            self.origin = ((pos[0] - self.view[0]//2) % self.cols,
+                           (pos[1] - self.view[1]//2) % self.rows)
+
+    def follow(self, pos: Point):
+        """Move camera so the given cell doesn't get close to the edges
+        of the view, keeping a margin of a quarter of the view."""
+        origin = list(self.origin)
+        for axis in (0, 1):
+            view, size = self.view[axis], self.size[axis]
+            if view == size:
+                continue
+            margin = view // 4
+            relative = (pos[axis] - origin[axis]) % size
+            if relative < margin:
+                origin[axis] = (pos[axis] - margin) % size
+            elif relative >= view - margin:
+                origin[axis] = (pos[axis] - view + margin + 1) % size
+        self.origin = tuple(origin)
+
+    def visible(self, pos: Point) -> bool:
+        """Return True if the cell is in the view."""
+        return ((pos[0] - self.origin[0]) % self.cols < self.view[0] and
+                (pos[1] - self.origin[1]) % self.rows < self.view[1])
+
+    def to_screen(self, pos: Point) -> Point:
+        """Return screen coordinates of the top left corner of a cell."""
+        return (self.rect.x +
+                (pos[0] - self.origin[0]) % self.cols * self.cell[0],
+                self.rect.y +
+                (pos[1] - self.origin[1]) % self.rows * self.cell[1])
+
+    def scroll(self) -> Point:
+        """Return how many pixels the view is scrolled from the origin."""
+        return (self.origin[0] * self.cell[0], self.origin[1] * self.cell[1])
+
+    def random_cell(self) -> Point:
+        """Return coordinates of a random cell, without walls."""
+        if self.free is not None:
+            return self.unpack(self.rng.choice(self.free))
+        return (self.rng.randrange(self.cols), self.rng.randrange(self.rows))
+
+    def is_wall(self, pos: Point) -> bool:
+        """Return True if there is a wall in the cell."""
+        return self.walls is not None and self.walls[self.pack(pos)] == 1
+
+    def pack(self, pos: Point) -> int:
+        """Return index of a cell, counting by rows."""
+        return pos[1] * self.cols + pos[0]
+
+    def unpack(self, index: int) -> Point:
+        """Return coordinates of a cell index."""
+        return (index % self.cols, index // self.cols)
+
+
+class Ring:
+    """Numbers in a ring buffer, packed as an array of the given type.
+
+    They are added at the end and dropped from the start in constant
+    time, and indexed like a list, negative indices from the end. Slices
+    are arrays. Storage doubles when full, it is always a power of 2."""
+    __slots__ = ("typecode", "raw", "data", "mask", "start", "count")
+
+    def __init__(self, typecode: str, values: Iterable[int] = ()):
+        self.typecode = typecode
+        self.allocate(8)
+        self.start = 0
+        self.count = 0
+        for value in values:
+            self.append(value)
+
+    def allocate(self, size: int):
+        """Make empty storage for size numbers. Bytes are kept too, they
+        can be searched without a copy."""
+        self.raw = bytearray(size * array(self.typecode).itemsize)
+        self.data = memoryview(self.raw).cast(self.typecode)
+        self.mask = size - 1
+
+    def get(self, slot: int) -> int:
+        """Return number in a slot of the storage."""
+        return self.data[slot]
+
+    def put(self, slot: int, value: int):
+        """Keep a number in a slot of the storage."""
+        self.data[slot] = value
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.pack(self.get((self.start + i) & self.mask)
+                             for i in range(*index.indices(self.count)))
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("ring index out of range")
+        return self.get((self.start + index) & self.mask)
+
+    def __iter__(self) -> Iterator[int]:
+        for i in range(self.count):
+            yield self.get((self.start + i) & self.mask)
+
+    def __reversed__(self) -> Iterator[int]:
+        for i in range(self.count - 1, -1, -1):
+            yield self.get((self.start + i) & self.mask)
+
+    def pack(self, values: Iterable[int]) -> array:
+        """Return numbers in a new array."""
+        return array(self.typecode, values)
+
+    def append(self, value: int):
+        """Add a number at the end."""
+        if self.count > self.mask:
+            values = list(self)
+            self.allocate(2 * self.count)
+            self.start = 0
+            for slot, old in enumerate(values):
+                self.put(slot, old)
+        self.put((self.start + self.count) & self.mask, value)
+        self.count += 1
+
+    def popleft(self) -> int:
+        """Remove the first number and return it."""
+        if not self.count:
+            raise IndexError("pop from an empty ring")
+        value = self.get(self.start)
+        self.start = (self.start + 1) & self.mask
+        self.count -= 1
+        return value
+
+    def clear(self):
+        """Remove every number, and give the storage back."""
+        self.allocate(8)
+        self.start = 0
+        self.count = 0
+
+    def rfind(self, value: int, stop: int = None) -> int:
+        """Return highest index of a number before index stop, the end
+        by default, -1 if it is not there. Bytes are searched, there is
+        no Python loop over the numbers."""
+        stop = self.count if stop is None else min(stop, self.count)
+        needle = array(self.typecode, [value]).tobytes()
+        width = len(needle)
+        size = self.mask + 1
+        end = self.start + stop
+        # Numbers are in two runs of the storage at most, last one first
+        for first, last, offset in ((0, end - size, size - self.start),
+                                    (self.start, min(end, size),
+                                     -self.start)):
+            high = last * width
+            while last > first:
+                found = self.raw.rfind(needle, first * width, high)
+                if found == -1:
+                    break
+                if found % width == 0:
+                    return found // width + offset
+                # Bytes of two numbers, go on before them
+                high = found + width - 1
+        return -1
+
+
+class CodeRing(Ring):
+    """Ring of 2 bit codes, packed 4 to a byte. Slices are bytes, a code
+    each."""
+    __slots__ = ()
+
+    def __init__(self, values: Iterable[int] = ()):
+        super().__init__("B", values)
+
+    def allocate(self, size: int):
+        self.raw = self.data = bytearray(size // 4)
+        self.mask = size - 1
+
+    def get(self, slot: int) -> int:
+        return self.data[slot >> 2] >> ((slot & 3) << 1) & 3
+
+    def put(self, slot: int, value: int):
+        shift = (slot & 3) << 1
+        self.data[slot >> 2] = (self.data[slot >> 2] & ~(3 << shift) |
+                                value << shift)
+
+    def pack(self, values: Iterable[int]) -> bytes:
+        return bytes(values)
+
+    def rfind(self, value: int, stop: int = None) -> int:
+        stop = self.count if stop is None else min(stop, self.count)
+        for index in range(stop - 1, -1, -1):
+            if self[index] == value:
+                return index
+        return -1
+
+
+class Occupancy:
+    """Number of snake pieces in every cell of the board, of every snake.
+
+    Snakes update it as they move, one head in and one tail out per tick,
+    so checking a cell costs the same whatever the number and length of
+    snakes. A cell with more than one piece is a crash. Walls count as a
+    piece that never moves."""
+    __slots__ = ("board", "cells")
+
+    def __init__(self, board: Board):
+        self.board = board
+        self.cells = None
+        self.clear()
+
+    def __contains__(self, pos: Point) -> bool:
+        """Return True if there is a snake in the given cell."""
+        return self.cells[self.board.pack(pos)] > 0
+
+    def mark(self) -> bytearray:
+        """Return a byte for every cell of the board, not 0 if there is a
+        snake or a wall."""
+        return self.cells
+
+    def add(self, indices: Iterator[int]):
+        """Add a piece in every given cell index."""
+        for index in indices:
+            self.cells[index] += 1
+
+    def remove(self, indices: Iterator[int]):
+        """Remove a piece from every given cell index."""
+        for index in indices:
+            self.cells[index] -= 1
+
+    def clear(self):
+        """Remove every snake."""
+        if self.board.walls is not None:
+            self.cells = bytearray(self.board.walls)
+        else:
+            self.cells = bytearray(self.board.cols * self.board.rows)
 
 
 class Apple:
-    """Define snack for snakes. Coordinates are in BLOCK units."""
+    """Define snack for snakes. Coordinates are in board cells."""
+    __slots__ = ("pos", "board", "sprite")
+    # Random cells tried for a new apple before looking at every cell
+    TRIES = 32
 
-    def __init__(self, snake_body: SnakeBody, sprite: pygame.Surface = None):
+    def __init__(self, obstacles: Union["Snake", Occupancy], board: Board,
+                 sprite: pygame.Surface = None):
         self.pos = (0, 0)
+        self.board = board
         self.sprite = sprite
-        self.new(snake_body)
+        self.new(obstacles)
 
-    def new(self, obstacles: SnakeBody):
-        """Create new random apple. It can't be in obstacles."""
-        width, height = pygame.display.get_surface().get_size()
-        banned_coordinates = [member[0] for member in obstacles]
-        while True:
-            self.pos = (random.randint(0, width//BLOCK[0] - 1),
-                        random.randint(0, height//BLOCK[1] - 1))
-            if self.pos not in banned_coordinates:
-                break
+    def new(self, obstacles: Union["Snake", Occupancy]) -> bool:
+        """Create new random apple. It can't be in obstacles, a snake or
+        an occupancy grid.
+
+        Return False if there is no cell left, the apple stays where it
+        was."""
+        # A few random cells are enough, unless the board is almost full
+        for _ in range(self.TRIES):
+            pos = self.board.random_cell()
+            if pos not in obstacles:
+                self.pos = pos
+                return True
+        # Every cell is looked at, the obstacles are marked once
+        taken = obstacles.mark()
+        cells = (self.board.free if self.board.free is not None
+                 else range(self.board.cols * self.board.rows))
+        free = [index for index in cells if not taken[index]]
+        if not free:
+            return False
+        self.pos = self.board.unpack(self.board.rng.choice(free))
+        return True
 
     def draw(self, screen: pygame.Surface):
-        """Draw an apple on the screen."""
-        rectangle = (self.pos[0] * BLOCK[0], self.pos[1] * BLOCK[1],
-                     BLOCK[0], BLOCK[1])
+        """Draw an apple on the screen, if it is in the view."""
+        if not self.board.visible(self.pos):
+            return
+        pos_x, pos_y = self.board.to_screen(self.pos)
         # Classic look
         if not self.sprite:
-            pygame.draw.rect(screen, APPLE_COLOR, rectangle)
+            pygame.draw.rect(screen, APPLE_COLOR,
+                             (pos_x, pos_y, *self.board.cell))
         # Apple with a peel
         else:
-            screen.blit(self.sprite, (self.pos[0] * BLOCK[0],
-                                      self.pos[1] * BLOCK[1]))
+            screen.blit(self.sprite, (pos_x, pos_y))
+
+
+class InputBuffer:
+    """FIFO buffer of direction changes, with the time they were pressed.
+
+    Everything runs in one thread, so a deque is enough, no locks needed.
+    Turns that would do nothing or reverse the snake are dropped when
+    they arrive, checked against the last accepted direction, so a quick
+    up-left on a snake going right keeps both turns."""
+    __slots__ = ("size", "pending", "last", "latencies", "count", "total",
+                 "worst", "dropped")
+
+    def __init__(self, size: int = 5, samples: int = 256):
+        self.size = size
+        # Tuples (direction, ticks when it was pressed, latency tag)
+        self.pending = deque()
+        # Direction the snake will have once the buffer is consumed
+        self.last = None
+        # Input to move latency, in ms
+        self.latencies = deque(maxlen=samples)
+        self.count = 0
+        self.total = 0
+        self.worst = 0
+        self.dropped = 0
+
+    def clear(self, direction: str):
+        """Empty the buffer, snake is going in direction."""
+        self.pending.clear()
+        self.last = direction
+
+    def push(self, direction: str, when: int, tag: Any = None) -> bool:
+        """Add a direction pressed at ticks when. Return False if dropped.
+
+        Parameter tag identifies the input for latency instrumentation."""
+        if (direction == self.last or direction == OPPOSITE[self.last] or
+                len(self.pending) >= self.size):
+            self.dropped += 1
+            return False
+        self.pending.append((direction, when, tag))
+        self.last = direction
+        if tag is not None:
+            latency.track_queued(tag)
+        return True
+
+    def pop(self, now: int) -> Optional[str]:
+        """Return next direction applied at ticks now, None if empty."""
+        if not self.pending:
+            return None
+        direction, when, tag = self.pending.popleft()
+        if tag is not None:
+            latency.track_moved(tag)
+        delay = now - when
+        self.latencies.append(delay)
+        self.count += 1
+        self.total += delay
+        self.worst = max(self.worst, delay)
+        return direction
+
+    def stats(self) -> Dict[str, float]:
+        """Return input to move latency statistics in ms.
+
+        Percentiles are computed over the most recent samples."""
+        recent = sorted(self.latencies)
+        if not recent:
+            return {'count': 0, 'dropped': self.dropped}
+        return {'count': self.count,
+                'dropped': self.dropped,
+                'mean': self.total / self.count,
+                'p50': recent[len(recent) // 2],
+                'p95': recent[min(len(recent) - 1,
+                                  len(recent) * 95 // 100)],
+                'max': self.worst}
 
 
 class Snake:
-    """Define player's snake. Body coordinates are in BLOCK units."""
-    def __init__(self):
+    """Define player's snake. Body coordinates are in board cells.
+
+    Body is packed, tail first, in ring buffers: cells holds the index of
+    every piece in the board, and directions its 2 bit direction code.
+    Pieces are decoded on demand, counting from the head, and nothing
+    else is kept per piece: searches go through the packed cells."""
+    __slots__ = ("board", "serial", "collision_ix", "direction",
+                 "direction_queue", "timer", "vel", "growing", "color",
+                 "cells", "directions", "skin", "occupancy")
+    # Direction of a code, and code of a direction
+    DIRECTIONS = ("up", "down", "left", "right")
+    CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+
+    def __init__(self, board: Board):
+        self.board = board
+        # Pieces are numbered as they are added, this is the head's
+        self.serial = 0
+        # Index of the piece the head crashed into
+        self.collision_ix = None
         self.direction = None
-        # FIFO queue, buffer of direction changes
-        self.direction_queue = queue.Queue(maxsize=5)
+        # Buffer of direction changes
+        self.direction_queue = InputBuffer()
         self.timer = 0
         self.vel = 10
         self.growing = False
         self.color = SNAKE_COLOR
-        self.body = []
+        self.cells = Ring(board.typecode)
+        self.directions = CodeRing()
+        # Occupancy grid shared with other snakes, if any
+        self.occupancy = None
         self.reset()
         self.skin = {}
 
     def reset(self):
-        """Build a new body for the snake (head & tail)."""
-        width, height = pygame.display.get_surface().get_size()
-        pos_x = random.randint(0, width//BLOCK[0] - 1)
-        pos_y = random.randint(0, height//BLOCK[1] - 1)
-        self.direction = random.choice(list(OPPOSITE))
-        self.body = [((pos_x, pos_y), self.direction),
-                     ((pos_x, pos_y), self.direction)]
+        """Build a new body for the snake (head & tail). It stays in its
+        occupancy grid, if any."""
+        occupancy = self.occupancy
+        self.detach()
+        pos_x, pos_y = self.board.random_cell()
+        # Don't go straight into a wall, if possible
+        directions = [direction for direction, (step_x, step_y)
+                      in STEP.items()
+                      if not self.board.is_wall(
+                          ((pos_x + step_x) % self.board.cols,
+                           (pos_y + step_y) % self.board.rows))]
+        self.direction = self.board.rng.choice(directions or list(OPPOSITE))
+        self.direction_queue.clear(self.direction)
+        self.growing = False
+        self.collision_ix = None
+        self.cells = Ring(self.board.typecode,
+                          [self.board.pack((pos_x, pos_y))] * 2)
+        self.directions = CodeRing([self.CODES[self.direction]] * 2)
+        self.serial = 1
+        if occupancy is not None:
+            self.attach(occupancy)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __contains__(self, pos: Point) -> bool:
+        """Return True if a piece of the body is in the given cell."""
+        index = self.board.pack(pos)
+        # An empty cell of the grid needs no search of the body
+        if self.occupancy is not None and not self.occupancy.cells[index]:
+            return False
+        return self.cells.rfind(index) != -1
+
+    def mark(self) -> bytearray:
+        """Return a byte for every cell of the board, not 0 if there is a
+        piece of the body."""
+        marks = bytearray(self.board.cols * self.board.rows)
+        for index in self.cells:
+            marks[index] = 1
+        return marks
+
+    @property
+    def body(self) -> SnakeBody:
+        """Return decoded body, a list of (cell, direction) from head."""
+        return [self.get_piece(i) for i in range(len(self.cells))]
 
     def get_head(self) -> Tuple[int, int]:
         """Return head position."""
-        return self.body[0][0]
+        return self.board.unpack(self.cells[-1])
 
-    def queue_direction(self, event: pygame.event.EventType,
-                        dir_dict: Dict[int, str]):
-        """Add new directions to the queue depending on keys pressed."""
-        try:
-            self.direction_queue.put_nowait(
-                dir_dict[event.key])
-        except queue.Full:
-            pass
+    def get_piece(self, index: int) -> Tuple[Point, str]:
+        """Return cell and direction of a piece, head is 0."""
+        return (self.board.unpack(self.cells[-1 - index]),
+                self.DIRECTIONS[self.directions[-1 - index]])
 
-    def move(self, now: int):
-        """Move snake according to its speed.
+    def get_direction(self, index: int) -> str:
+        """Return direction of a piece, head is 0."""
+        return self.DIRECTIONS[self.directions[-1 - index]]
+
+    def queue_direction(self, direction: str, when: int = None,
+                        tag: Any = None):
+        """Add new direction to the queue.
+
+        Parameter when is the ticks it was pressed at, now by default."""
+        if when is None:
+            when = pygame.time.get_ticks()
+        self.direction_queue.push(direction, when, tag)
+
+    def move(self, now: int) -> bool:
+        """Move snake according to its speed. Return True if it moved."""
+        step = 1000.0 / self.vel
+        if now - self.timer >= step:
+            # Keep a steady pace whatever the frame rate, but don't try
+            # to catch up after a pause or a long stall
+            self.timer += step
+            if now - self.timer >= step:
+                self.timer = now
+            self.step(now)
+            return True
+        return False
+
+    def step(self, now: int):
+        """Move snake one cell, at ticks now.
 
         Movement is done by inserting a new head and removing tail."""
-        width, height = pygame.display.get_surface().get_size()
-        if now - self.timer >= 1000.0 / self.vel:
-            self.timer = now
-            head_x, head_y = self.get_head()
-
-            # Try to get new direction from queue
-            try:
-                new_dir = self.direction_queue.get_nowait()
-            except queue.Empty:
-                new_dir = self.direction
-            # Avoid 180º turns
-            if new_dir != OPPOSITE[self.direction]:
-                self.direction = new_dir
-
-            # Move according to direction
-            if self.direction == "up":
-                self.body.insert(0, ((head_x, head_y - 1), self.direction))
-            elif self.direction == "down":
-                self.body.insert(0, ((head_x, head_y + 1), self.direction))
-            elif self.direction == "left":
-                self.body.insert(0, ((head_x - 1, head_y), self.direction))
-            elif self.direction == "right":
-                self.body.insert(0, ((head_x + 1, head_y), self.direction))
-
-            # Don't remove tail if snake ate apple
-            if self.growing:
-                self.growing = False
-            else:
-                self.body.pop()
-
-            # Infinite screen, if snake crossses the screen edges,
-            # it appears going out of the opposite edge
-            head_x, head_y = self.get_head()
-            if head_x >= width//BLOCK[0]:
-                self.body.insert(0, ((0, head_y), self.direction))
-                self.body.pop(1)
-            elif head_x < 0:
-                self.body.insert(0, ((width//BLOCK[0] - 1, head_y),
-                                     self.direction))
-                self.body.pop(1)
-            elif head_y >= height//BLOCK[1]:
-                self.body.insert(0, ((head_x, 0), self.direction))
-                self.body.pop(1)
-            elif head_y < 0:
-                self.body.insert(0, ((head_x, height//BLOCK[1] - 1),
-                                     self.direction))
-                self.body.pop(1)
+        cols, rows = self.board.size
+        head_x, head_y = self.get_head()
+
+        # Try to get new direction from queue, 180º turns were
+        # already dropped when queued
+        new_dir = self.direction_queue.pop(now)
+        if new_dir is not None:
+            self.direction = new_dir
+
+        # Move according to direction
+        if self.direction == "up":
+            head_y -= 1
+        elif self.direction == "down":
+            head_y += 1
+        elif self.direction == "left":
+            head_x -= 1
+        elif self.direction == "right":
+            head_x += 1
+
+        # Infinite screen, if snake crossses the screen edges,
+        # it appears going out of the opposite edge
+        head = (head_x % cols, head_y % rows)
+        self.cells.append(self.board.pack(head))
+        self.directions.append(self.CODES[self.direction])
+        self.serial += 1
+        if self.occupancy is not None:
+            self.occupancy.cells[self.cells[-1]] += 1
+
+        # Don't remove tail if snake ate apple
+        if self.growing:
+            self.growing = False
+        else:
+            self.drop_tail()
+
+    def drop_tail(self):
+        """Remove the last piece of the body."""
+        if self.occupancy is not None:
+            self.occupancy.cells[self.cells[0]] -= 1
+        self.cells.popleft()
+        self.directions.popleft()
+
+    def sync(self, serial: int, length: int, cells: List[int],
+             directions: bytes):
+        """Update the body from a remote game.
+
+        Parameter serial is the serial number of the head, and cells and
+        directions are the last pieces of the body, ending at the head.
+        Pieces the snake already has are skipped, so they can be sent
+        again."""
+        first = serial - len(cells) + 1
+        for i in range(max(0, self.serial + 1 - first), len(cells)):
+            self.cells.append(cells[i])
+            self.directions.append(directions[i])
+            self.serial = first + i
+        while len(self.cells) > length:
+            self.drop_tail()
+        self.direction = self.get_direction(0)
+
+    def clear(self):
+        """Remove the whole body, before syncing a new one."""
+        self.detach()
+        self.cells.clear()
+        self.directions.clear()
+        # No piece yet, the first one synced gets any serial number
+        self.serial = -1
 
     def check_collision(self) -> bool:
-        """Check if head has crashed into the body."""
-        head = self.get_head()
-        for member in self.body[1:]:
-            if head == member[0]:
-                return True
+        """Check if head has crashed into the body or a wall.
+
+        Index of the crashed piece is kept in collision_ix, it is None
+        for walls."""
+        if self.board.walls is not None and self.board.walls[self.cells[-1]]:
+            return True
+        neck = len(self.cells) - 1
+        found = self.cells.rfind(self.cells[-1], neck)
+        if found != -1:
+            self.collision_ix = neck - found
+            return True
         return False
 
+    def attach(self, occupancy: Occupancy):
+        """Put the body in a shared occupancy grid, kept up to date while
+        moving."""
+        self.occupancy = occupancy
+        occupancy.add(self.cells)
+
+    def detach(self):
+        """Take the body out of its occupancy grid, if any."""
+        if self.occupancy is not None:
+            self.occupancy.remove(self.cells)
+            self.occupancy = None
+
+    def check_crowded(self) -> bool:
+        """Check if head has crashed into any snake of the occupancy grid,
+        itself included. Every snake must have moved first."""
+        return self.occupancy.cells[self.cells[-1]] > 1
+
     def load_skin(self, skin: pygame.Surface = None):
         """Load sprites to a dictionary.
 
         Parameter skin must be a surface with 4x3 sprites for straight and
         curved body, tail and head."""
         if skin:
+            block = (skin.get_width() // 4, skin.get_height() // 3)
             # Split each image of the sprite
-            line_h = skin.subsurface((0, 0, BLOCK[0], BLOCK[1]))
-            curve_r = skin.subsurface((BLOCK[0], 0, BLOCK[0], BLOCK[1]))
-            tail_d = skin.subsurface((BLOCK[0] * 2, 0, BLOCK[0], BLOCK[1]))
-            head_u = skin.subsurface((BLOCK[0] * 3, 0, BLOCK[0], BLOCK[1]))
-
-            line_h2 = skin.subsurface((0, BLOCK[1]*2,
-                                       BLOCK[0], BLOCK[1]))
-            curve_r2 = skin.subsurface((BLOCK[0], BLOCK[1]*2,
-                                        BLOCK[0], BLOCK[1]))
-            tail_d2 = skin.subsurface((BLOCK[0] * 2, BLOCK[1]*2,
-                                       BLOCK[0], BLOCK[1]))
-
-            line_h_down_blood = skin.subsurface((0, BLOCK[1],
-                                                 BLOCK[0], BLOCK[1]))
-            curve_r_left_blood = skin.subsurface((BLOCK[0], BLOCK[1],
-                                                  BLOCK[0], BLOCK[1]))
-            tail_d_left_blood = skin.subsurface((BLOCK[0]*2, BLOCK[1],
-                                                 BLOCK[0], BLOCK[1]))
-            tail_d_up_blood = skin.subsurface((BLOCK[0]*3, BLOCK[1],
-                                               BLOCK[0], BLOCK[1]))
+            line_h = skin.subsurface((0, 0, block[0], block[1]))
+            curve_r = skin.subsurface((block[0], 0, block[0], block[1]))
+            tail_d = skin.subsurface((block[0] * 2, 0, block[0], block[1]))
+            head_u = skin.subsurface((block[0] * 3, 0, block[0], block[1]))
+
+            line_h2 = skin.subsurface((0, block[1]*2,
+                                       block[0], block[1]))
+            curve_r2 = skin.subsurface((block[0], block[1]*2,
+                                        block[0], block[1]))
+            tail_d2 = skin.subsurface((block[0] * 2, block[1]*2,
+                                       block[0], block[1]))
+
+            line_h_down_blood = skin.subsurface((0, block[1],
+                                                 block[0], block[1]))
+            curve_r_left_blood = skin.subsurface((block[0], block[1],
+                                                  block[0], block[1]))
+            tail_d_left_blood = skin.subsurface((block[0]*2, block[1],
+                                                 block[0], block[1]))
+            tail_d_up_blood = skin.subsurface((block[0]*3, block[1],
+                                               block[0], block[1]))
 
             # Straight body
             self.skin['hor'] = (line_h, line_h2)
@@ -253,15 +744,16 @@ class Snake:
 
     def get_body_shape(self, index: int) -> str:
         """Return the shape of the given part of the body."""
-        current_dir = self.body[index][1]
-        previous_dir = self.body[index-1][1]
+        current_dir = self.get_direction(index)
+        previous_dir = self.get_direction(index - 1) if index else None
 
+        piece = None
         # Head
         if index == 0:
             piece = "head-" + current_dir
 
         # Tail
-        elif index == len(self.body) - 1:
+        elif index == len(self.cells) - 1:
             piece = "tail-" + previous_dir
 
         # Straight body part
@@ -287,67 +779,175 @@ class Snake:
 
         return piece
 
-    def draw_blood(self, win: pygame.Surface):
-        """Draw blood around snake's head."""
-        # Center of its head
-        head_x, head_y = self.get_head()
-        head_x = head_x * BLOCK[0] + BLOCK[0]//2
-        head_y = head_y * BLOCK[1] + BLOCK[1]//2
+    def draw_bloody_piece(self, win: pygame.Surface):
+        """Draw the piece of the body the head crashed into, with a bloody
+        hole on it."""
+        head_direction = self.get_direction(0)
+        piece_col_type = self.get_body_shape(self.collision_ix)
+        bloody_piece = f"{piece_col_type}-{OPPOSITE[head_direction]}-blood"
+        # Head can't get into a straight piece along its direction
+        if bloody_piece in self.skin:
+            rectangle = (*self.board.to_screen(self.get_head()),
+                         *self.board.cell)
+            win.blit(self.skin[bloody_piece], rectangle)
 
-        radius = math.sqrt(random.random())
-        alpha = 2 * math.pi * random.random()
-        color = (random.randint(50, 250), 0, 0)
+    def in_view(self) -> Iterator[Tuple[int, Point]]:
+        """Yield pieces (index, cell) in the view, counting from the head.
 
-        # Draw red rectangle around the center of its head
-        pos_x = BLOCK[0] * radius * math.cos(alpha) + head_x
-        pos_y = BLOCK[1] * radius * math.sin(alpha) + head_y
-        pygame.draw.rect(win, color, (pos_x, pos_y, 2, 2))
+        Every piece is next to the one before, so from a piece out of the
+        view, at least as many pieces as cells to the view are skipped."""
+        cols, rows = self.board.size
+        origin_x, origin_y = self.board.origin
+        view_w, view_h = self.board.view
+        cells = self.cells
+        count = len(cells)
+        index = 0
+        while index < count:
+            cell = cells[-1 - index]
+            pos_x, pos_y = cell % cols, cell // cols
+            col = (pos_x - origin_x) % cols
+            row = (pos_y - origin_y) % rows
+            if col < view_w and row < view_h:
+                yield index, (pos_x, pos_y)
+                index += 1
+                continue
+            # Cells to the view, going either way around the board
+            index += (min(col - view_w + 1, cols - col) if col >= view_w
+                      else 0)
+            index += (min(row - view_h + 1, rows - row) if row >= view_h
+                      else 0)
 
-        # Draw body to cover blood splashes over the body, and hole on top
-        self.draw(win)
-        if self.skin:
-            self.draw_bloody_piece(win)
+    def draw(self, win: pygame.Surface):
+        """Draw the snake on the screen.
 
-    def draw_bloody_piece(self, win: pygame.Surface):
-        """Draw a piece of the body with a bloody hole."""
-        # Search for collided piece
-        head = self.get_head()
-        for i in range(1, len(self.body)):
-            if head == self.body[i][0]:
-                collision_ix = i
-                break
-
-        head_direction = self.body[0][1]
-        piece_col_type = self.get_body_shape(collision_ix)
-        rectangle = (self.body[i][0][0]*BLOCK[0],
-                     self.body[i][0][1]*BLOCK[1],
-                     BLOCK[0], BLOCK[1])
+        Long snakes on big boards have thousands of pieces, so only pieces
+        in the view are visited when the board scrolls, and sprites are
+        blitted at once."""
+        cell_w, cell_h = self.board.cell
+        left, top = self.board.rect.topleft
+        origin_x, origin_y = self.board.origin
+        cols, rows = self.board.size
+        view_w, view_h = self.board.view
 
-        bloody_piece = f"{piece_col_type}-{OPPOSITE[head_direction]}-blood"
-        win.blit(self.skin[bloody_piece], rectangle)
+        # Pieces (index, cell) that could be on screen
+        if self.board.scrolls:
+            pieces = self.in_view()
+        else:
+            unpack = self.board.unpack
+            pieces = enumerate(unpack(cell) for cell in reversed(self.cells))
 
-    def draw(self, win: pygame.Surface):
-        """Draw the snake on the screen."""
-        for i in range(len(self.body)):
-            rectangle = (self.body[i][0][0]*BLOCK[0],
-                         self.body[i][0][1]*BLOCK[1],
-                         BLOCK[0], BLOCK[1])
-            # Classic look
-            if not self.skin:
-                pygame.draw.rect(win, self.color, rectangle)
-
-            # Paint skin, alternating sprite
-            else:
-                piece = self.get_body_shape(i)
-                win.blit(self.skin[piece][i % 2], rectangle)
+        # Screen coordinates of pieces in the view
+        on_screen = []
+        for i, (pos_x, pos_y) in pieces:
+            col = (pos_x - origin_x) % cols
+            row = (pos_y - origin_y) % rows
+            if col < view_w and row < view_h:
+                on_screen.append((i, (left + col*cell_w, top + row*cell_h)))
+
+        # Classic look
+        if not self.skin:
+            for _, (pos_x, pos_y) in on_screen:
+                win.fill(self.color, (pos_x, pos_y, cell_w, cell_h))
+
+        # Paint skin, alternating sprite
+        else:
+            win.blits([(self.skin[self.get_body_shape(i)][i % 2], coords)
+                       for i, coords in on_screen], False)
+
+
+class Bot:
+    """Greedy driver of a snake. Every tick it turns towards the closest
+    apple, avoiding cells taken in the occupancy grid.
+
+    It only looks one cell ahead, through the grid, so dozens of bots cost
+    little on boards of any size."""
+    __slots__ = ("snake",)
+
+    def __init__(self, snake: Snake):
+        self.snake = snake
+
+    def steer(self, targets: List[Point], now: int):
+        """Queue the best direction to go next. Parameter targets are the
+        cells of the apples."""
+        snake = self.snake
+        cols, rows = snake.board.size
+        cells = snake.occupancy.cells
+        head_x, head_y = snake.get_head()
+        best, best_distance = None, None
+        for direction, (step_x, step_y) in STEP.items():
+            if direction == OPPOSITE[snake.direction]:
+                continue
+            pos_x, pos_y = (head_x + step_x) % cols, (head_y + step_y) % rows
+            if cells[pos_y * cols + pos_x]:
+                continue
+            # Board wraps around, so distances do too
+            distance = min(
+                min(abs(pos_x - x), cols - abs(pos_x - x)) +
+                min(abs(pos_y - y), rows - abs(pos_y - y))
+                for x, y in targets)
+            # Random ties, so bots don't move in lockstep
+            distance += snake.board.rng.random() / 2
+            if best is None or distance < best_distance:
+                best, best_distance = direction, distance
+        if best is not None:
+            snake.queue_direction(best, now)
+
+
+class BloodSplatter:
+    """Blood splashed around a point of the screen.
+
+    Drops are created in batches, as many as time elapsed asks for, and
+    stay on their own layer, so drawing costs the same however many
+    drops there are."""
+    __slots__ = ("radius", "rate", "timer", "rect", "layer")
+
+    def __init__(self, center: Point, radius: Size, rate: int = 60):
+        self.radius = radius
+        # Drops per second
+        self.rate = rate
+        self.timer = None
+        self.rect = pygame.Rect(0, 0, radius[0]*2 + 2, radius[1]*2 + 2)
+        self.rect.center = center
+        self.layer = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+
+    def splash(self, now: int):
+        """Add drops for the time elapsed since last splash."""
+        if self.timer is None:
+            self.timer = now
+        count = int((now - self.timer) * self.rate // 1000)
+        if count <= 0:
+            return
+        self.timer += count * 1000.0 / self.rate
+
+        # Random points of the circle, a bit darker or lighter red
+        for _ in range(count):
+            radius = math.sqrt(random.random())
+            alpha = 2 * math.pi * random.random()
+            color = (random.randint(50, 250), 0, 0)
+            pos_x = self.radius[0] * (1 + radius * math.cos(alpha))
+            pos_y = self.radius[1] * (1 + radius * math.sin(alpha))
+            self.layer.fill(color, (pos_x, pos_y, 2, 2))
+
+    def draw(self, screen: pygame.Surface, area: pygame.Rect = None):
+        """Draw the drops on the screen, only those in area if given."""
+        if area is None:
+            screen.blit(self.layer, self.rect)
+        else:
+            screen.blit(self.layer, area,
+                        area.move(-self.rect.x, -self.rect.y))
 
 
 class ParaBackground:
-    """A moving background with parallax effect."""
+    """A moving background with parallax effect.
+
+    The layer is blended over the surface every frame. Only its visible
+    part is kept, RLE encoded, since it is mostly transparent pixels."""
+    __slots__ = ("surface", "rect_s", "rect_l", "max_x", "layer",
+                 "layer_offset", "uncovered", "timer", "vel", "moved",
+                 "direction")
 
     def __init__(self, surface: pygame.Surface, layer: pygame.Surface):
         self.surface = surface
-        self.layer = layer
         self.rect_s = surface.get_rect()
         self.rect_l = layer.get_rect()
         width, height = pygame.display.get_surface().get_size()
@@ -356,13 +956,40 @@ class ParaBackground:
         self.rect_l.x = self.rect_l.w - width
         self.rect_l.centery = height // 2
         self.max_x = self.rect_l.x
+
+        # Crop transparent borders of the layer, rect_l is still the
+        # whole layer for moving it
+        bounds = layer.get_bounding_rect()
+        self.layer = layer.subsurface(bounds).copy()
+        self.layer.set_alpha(255, pygame.RLEACCEL)
+        self.layer_offset = bounds.topleft
+
+        # Parts of the screen the surface doesn't cover
+        self.uncovered = [rect for rect in (
+            pygame.Rect(0, 0, width, self.rect_s.top),
+            pygame.Rect(0, self.rect_s.bottom, width,
+                        height - self.rect_s.bottom)) if rect.h > 0]
         self.timer = 0
         self.vel = 60
         self.moved = False
         self.direction = -1  # Left
 
-    def move(self):
-        """Move across the screen.
+    def move(self, now: int):
+        """Move across the screen according to its speed.
+
+        Speed is in pixels per second, so it doesn't depend on frame rate.
+        If it has fallen more than a second behind, move just one step."""
+        steps = int((now - self.timer) * self.vel // 1000)
+        if steps > self.vel:
+            self.timer = now
+            steps = 1
+        elif steps > 0:
+            self.timer += steps * 1000.0 / self.vel
+        for _ in range(steps):
+            self.step()
+
+    def step(self):
+        """Move one pixel across the screen.
 
         Scroll background horizontally, changing its direction when
         left part of image reaches max_x (moving to right) or
@@ -386,13 +1013,17 @@ class ParaBackground:
             self.direction = - self.direction
 
     def draw(self, screen: pygame.surface):
-        """Draw on the screen."""
+        """Draw on the screen, covering it all."""
+        for rect in self.uncovered:
+            screen.fill(BGCOLOR, rect)
         screen.blit(self.surface, self.rect_s)
-        screen.blit(self.layer, self.rect_l)
+        screen.blit(self.layer, self.rect_l.move(self.layer_offset))
 
 
 class Slider:
     """Create a bar object filled at the given percentage."""
+    __slots__ = ("percent", "color", "rect")
+
     def __init__(self, percent: float, width: int):
         self.percent = percent
         self.color = (0, 0, 0)
@@ -1,5 +1,7 @@
 """Retrieve and serve assets for the game."""
 from pathlib import Path
+from time import perf_counter
+from typing import List
 
 import pygame
 import pygame.freetype
@@ -8,12 +10,25 @@ fonts = {}
 sounds = {}
 images = {}
 sprites = {}
+# Reserved mixer channel of every sound category, and category of sounds
+channels = {}
+categories = {}
+sound_volume = 1.0
+# Music track loaded in the mixer, and time spent loading tracks in ms
+music_track = None
+music_stalls = []
 
 FONTS_PATH = Path('assets/fonts/')
 SOUNDS_PATH = Path('assets/audio/')
 IMAGES_PATH = Path('assets/images/')
 SPRITES_PATH = Path('assets/sprites/')
 
+# Channel number reserved for each sound category, so menu blips and
+# gameplay sounds never cut each other
+CHANNELS = {'ui': 0, 'game': 1}
+# Event posted when the channel of a category stops playing
+SOUND_END = {'ui': pygame.USEREVENT + 1, 'game': pygame.USEREVENT + 2}
+
 
 # LOADS =====================================================================
 def load_font(name: str, size: int, label: str):
@@ -21,9 +36,18 @@ def load_font(name: str, size: int, label: str):
     fonts[label] = pygame.freetype.Font(str(FONTS_PATH / name), size)
 
 
-def load_sound(name: str, label: str):
-    """Load sounds for the game."""
+def load_sound(name: str, label: str, category: str = "game"):
+    """Load sounds for the game, played in the channel of category."""
     sounds[label] = pygame.mixer.Sound(str(SOUNDS_PATH / name))
+    categories[label] = category
+
+
+def load_channels():
+    """Reserve a mixer channel for every sound category."""
+    pygame.mixer.set_reserved(len(CHANNELS))
+    for category, number in CHANNELS.items():
+        channels[category] = pygame.mixer.Channel(number)
+        channels[category].set_endevent(SOUND_END[category])
 
 
 def load_image(name: str, label: str, alpha: bool = False):
@@ -41,8 +65,13 @@ def load_sprite(name: str, label: str):
 
 
 def load_music(name: str):
-    """Load music for the game."""
+    """Load music for the game, measuring how long it stalls."""
+    global music_track
+
+    start = perf_counter()
     pygame.mixer.music.load(str(SOUNDS_PATH / name))
+    music_stalls.append((perf_counter() - start) * 1000)
+    music_track = name
 
 
 def load_assets():
@@ -68,10 +97,11 @@ def load_assets():
     load_sprite("snake-sprites.png", "sheet")
 
     # Sounds
+    load_channels()
     load_sound("snake-bite.wav", "eat")
     load_sound("snake-crash.wav", "crash")
-    load_sound("menu-select.wav", "menu-sel")
-    load_sound("menu-accept.wav", "menu-accept")
+    load_sound("menu-select.wav", "menu-sel", "ui")
+    load_sound("menu-accept.wav", "menu-accept", "ui")
 
 
 # GETS ======================================================================
@@ -95,8 +125,58 @@ def get_sprite(label: str) -> pygame.Surface:
     return sprites[label]
 
 
+def get_channel(category: str) -> pygame.mixer.Channel:
+    """Return channel reserved for a sound category."""
+    return channels[category]
+
+
+def get_music_stalls() -> List[float]:
+    """Return time spent loading every music track, in ms."""
+    return music_stalls
+
+
 # HELPS =====================================================================
+def play_sound(label: str, volume: float = None):
+    """Play a sound in the channel of its category, cutting the last one.
+
+    Volume is the sound effects setting unless given."""
+    channel = channels[categories[label]]
+    channel.set_volume(sound_volume if volume is None else volume)
+    channel.play(sounds[label])
+
+
+def play_music(name: str):
+    """Play a music track in loop, None stops the music.
+
+    A track already playing goes on, and a track already loaded is
+    played again without reading it from disk."""
+    if name is None:
+        stop_music()
+    elif name != music_track:
+        load_music(name)
+        pygame.mixer.music.play(-1)
+    elif not pygame.mixer.music.get_busy():
+        pygame.mixer.music.play(-1)
+
+
+def stop_music():
+    """Stop the music, the track stays loaded."""
+    pygame.mixer.music.stop()
+
+
+def is_sound_end(event: pygame.event.EventType, category: str) -> bool:
+    """Return True if event tells that a sound category stopped playing.
+
+    A sound cut by a newer one also posts the event, but then the
+    channel is still busy."""
+    return (event.type == SOUND_END[category] and
+            not channels[category].get_busy())
+
+
 def set_volume(volume: float):
-    """Set volume of all sounds."""
-    for audio in sounds.values():
-        audio.set_volume(volume)
+    """Set volume of sound effects, applied to their channels."""
+    global sound_volume
+
+    sound_volume = volume
+    for channel in channels.values():
+        channel.set_volume(volume)
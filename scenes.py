@@ -1,26 +1,68 @@
 """Scenes of the Game."""
 import random
 import datetime
-from typing import Tuple, List
+from typing import List
 
 import pygame
 import pygame.freetype
 
 import settings
 import resources
-from objects import Apple, Snake, ParaBackground, Slider
+import scores
+import latency
+import leaderboard
+import levels
+import netcode
+import spectator
+from autopilot import Autopilot
+from objects import (Board, Apple, Snake, Bot, Occupancy, BloodSplatter,
+                     ParaBackground, Slider)
 from helpers import (render_text, render_wrapped_text, get_surface,
-                     build_background)
+                     scale_tile, split_sprites, build_background,
+                     draw_walls)
 from consts import (BGCOLOR, WHITE, BLACK, APPLE_COLOR,
-                    BLOCK, SPRITE_BLOCK)
+                    SNAKE_COLOR, BOT_COLOR, BOT_TINT, FRAME_MODES,
+                    BOARD_SIZES, BOT_COUNTS,
+                    OPPOSITE, DEFAULT_MODE, VERSUS_MODE, Size)
 
 
 class SceneBase:
-    """Boiler-plate class for game scenes."""
+    """Boiler-plate class for game scenes.
+
+    Scenes are built once and kept in a pool, every switch enters the
+    pooled instance again. Setup goes in __init__, and state that must be
+    reset on every visit goes in enter."""
+    # Music track played in the scene, None for silence
+    track = None
+    # Scene instances by class
+    pool = {}
 
     def __init__(self):
         self.next = self
 
+    @classmethod
+    def visit(cls, *args) -> "SceneBase":
+        """Return the scene of this class, built on the first visit, after
+        entering it with args."""
+        scene = SceneBase.pool.get(cls)
+        if scene is None:
+            scene = SceneBase.pool[cls] = cls()
+        scene.enter(*args)
+        return scene
+
+    def enter(self):
+        """Boiler-plate method for resetting the scene on every visit."""
+        self.next = self
+        self.play_music()
+
+    def exit(self):
+        """Boiler-plate method for cleaning up after the last frame of the
+        scene."""
+
+    def play_music(self):
+        """Play the music of the scene, it goes on if already playing."""
+        resources.play_music(self.track)
+
     def process_input(self, events: List[pygame.event.EventType],
                       pressed_keys: List[bool]):
         """Boiler-plate method for processing events in game scenes."""
@@ -34,10 +76,12 @@ class SceneBase:
         """Boiler-plate method for drawing on screen in game scenes."""
         print("Override!", screen)
 
-    def switch_to_scene(self, next_scene: "SceneBase"):
-        """Boiler-plate method for switching in between game scenes."""
-        pygame.mixer.music.stop()
-        self.next = next_scene() if next_scene else None
+    def switch_to_scene(self, next_scene: type, *args):
+        """Boiler-plate method for switching in between game scenes.
+
+        Parameter next_scene is a scene class, args are passed to its
+        enter method."""
+        self.next = next_scene.visit(*args) if next_scene else None
 
     def terminate(self):
         """Boiler-plate method for closing the game."""
@@ -45,29 +89,69 @@ class SceneBase:
 
 
 class SceneTransition(SceneBase):
-    """Transition between scenes."""
-    def __init__(self, next_scene):
-        SceneBase.__init__(self)
-        self.surface = get_surface(pygame.display.get_surface().get_size(),
-                                   BLACK, 15)
-        self.rect = self.surface.get_rect()
-        self.running = False
+    """Crossfade between scenes.
+
+    Outgoing frame is kept on the first frame, and the incoming scene is
+    built and drawn off screen right away, so the fade only blends two
+    surfaces following a precomputed alpha ramp. It is timed, so it looks
+    the same at any frame rate."""
+    # Duration in ms
+    DURATION = 400
+    # Alpha of the incoming frame along the fade, eased in and out
+    RAMP = [round(255 * (3*t**2 - 2*t**3))
+            for t in (i / 63 for i in range(64))]
+
+    def __init__(self):
+        super().__init__()
+        size = pygame.display.get_surface().get_size()
+        self.outgoing = None
+        self.incoming = pygame.Surface(size).convert()
+        self.scene = None
         self.timer = 0
-        self.when_finished = next_scene
+        self.alpha = 0
+        self.when_finished = None
+
+    def enter(self, next_scene: type, *args):
+        super().enter()
+        self.outgoing = None
+        self.scene = None
+        self.when_finished = (next_scene, args)
+
+    def play_music(self):
+        # Music is left to the incoming scene
+        pass
 
     def process_input(self, events, pressed_keys):
         pass
 
     def update(self, now: int):
-        # Finish transition after 1 second
-        if not self.running:
-            self.running = True
+        # Build next scene while fading
+        if self.scene is None:
+            next_scene, args = self.when_finished
+            self.scene = next_scene.visit(*args)
             self.timer = now
-        if now - self.timer > 1000:
-            self.switch_to_scene(self.when_finished)
+
+        progress = (now - self.timer) / self.DURATION
+        self.alpha = self.RAMP[min(int(progress * len(self.RAMP)),
+                                   len(self.RAMP) - 1)]
+
+        # Last frame shows the incoming scene as it is. It was already
+        # entered, so don't use switch_to_scene
+        if progress >= 1:
+            self.next = self.scene
+
+    def exit(self):
+        # Don't keep a reference to the outgoing frame
+        self.outgoing = None
 
     def render(self, screen: pygame.Surface):
-        screen.blit(self.surface, self.rect)
+        if self.outgoing is None:
+            self.outgoing = screen.copy()
+            self.scene.render(self.incoming)
+
+        screen.blit(self.outgoing, (0, 0))
+        self.incoming.set_alpha(self.alpha)
+        screen.blit(self.incoming, (0, 0))
 
 
 class SceneExit(SceneBase):
@@ -77,6 +161,10 @@ class SceneExit(SceneBase):
         super().__init__()
         self.timer = 0
         self.started = False
+
+    def enter(self):
+        super().enter()
+        self.started = False
         pygame.display.set_mode((480, 320), pygame.NOFRAME)
 
     def process_input(self, events, pressed_keys):
@@ -108,6 +196,9 @@ class SceneExit(SceneBase):
 
 class SceneGame(SceneBase):
     """Scene with snakes biting things."""
+    track = "snake-music-Rafael_Krux.ogg"
+    # Game mode of its highscores
+    mode = DEFAULT_MODE
 
     def __init__(self):
         super().__init__()
@@ -116,42 +207,144 @@ class SceneGame(SceneBase):
         self.has_crashed = False
         self.event_painted = False
         self.show_grid = False
-        self.play_music()
-
-        # Create background from random texture
-        i = random.getrandbits(1) + 1
-        self.background = build_background(resources.get_image(
-            f"snake-tile{i}"))
+        # Game only needs to be drawn again when something changes
+        self.dirty = True
+        # Settings the board was built with, (board size, classic, level)
+        self.layout = None
+        self.board = None
+        self.tile = None
+        self.backgrounds = {}
+        # Background repeats every period, in pixels
+        self.period = (0, 0)
+        self.sneik = None
+        self.apple = None
+        # Autopilot playing, and if it played this game
+        self.autopilot = None
+        self.autopiloted = False
+
+        # Crash effect, blood between snapshots of what is under and over it
+        self.blood = None
+        self.crash_area = None
+        self.under_blood = None
+        self.over_blood = None
+
+    def enter(self):
+        super().enter()
+        self.timer = 0
+        self.is_paused = False
+        self.has_crashed = False
+        self.event_painted = False
+        self.show_grid = False
+        self.dirty = True
+
+        # Board and graphics only change with settings
+        layout = (settings.get_board(), settings.get_setting("classic"),
+                  settings.get_setting("level"))
+        if layout != self.layout:
+            self.layout = layout
+            self.build_board()
+        self.reset_board()
+        self.board.center(self.sneik.get_head())
+        spectator.new_game()
+
+        # Autopilot goes on playing, maybe with a new snake
+        if (self.autopilot is not None and
+                self.autopilot.snake is not self.sneik):
+            self.autopilot = type(self.autopilot)(self.sneik)
+        self.autopiloted = self.autopilot is not None
+
+    def exit(self):
+        # Drop crash snapshots
+        self.blood = None
+        self.crash_area = None
+        self.under_blood = None
+        self.over_blood = None
+
+    def build_board(self):
+        """Create board, backgrounds, snake and apple for current settings."""
+        level = settings.get_setting("level")
+        walls = (levels.load_level(level, settings.get_board())
+                 if level else None)
+
+        # Fit board in the screen, or the view if it is too big
+        self.board = Board(settings.get_board(),
+                           pygame.display.get_surface().get_rect(), walls)
+        self.build_backgrounds()
 
         # Create objects snake and apple
         if not settings.get_setting("classic"):
-            apple_skin, snake_skin = self.split_sprites(
-                resources.get_sprite("sheet"))
+            apple_skin, snake_skin = split_sprites(
+                resources.get_sprite("sheet"), self.board.cell)
         else:
             apple_skin, snake_skin = None, None
-        self.sneik = Snake()
+        self.sneik = Snake(self.board)
         self.sneik.load_skin(snake_skin)
-        self.apple = Apple(self.sneik.body, apple_skin)
-
-    @staticmethod
-    def play_music():
-        """Load and play epic music."""
-        resources.load_music("snake-music-Rafael_Krux.ogg")
-        pygame.mixer.music.play(-1)
-
-    @staticmethod
-    def split_sprites(sheet: pygame.Surface) -> Tuple[pygame.Surface,
-                                                      pygame.Surface]:
-        """Return apple and snake sprites already resized.
-
-        Parameter sheet should contain 4x3 sprites, with the apple
-        in the bottom rigth corner."""
-        apple = sheet.subsurface((SPRITE_BLOCK[0] * 3, SPRITE_BLOCK[1] * 2,
-                                  SPRITE_BLOCK[0], SPRITE_BLOCK[1]))
-        apple = pygame.transform.scale(apple, (BLOCK[0], BLOCK[1]))
-        snake = sheet
-        snake = pygame.transform.scale(snake, (BLOCK[0]*4, BLOCK[1]*3))
-        return apple, snake
+        self.apple = Apple(self.sneik, self.board, apple_skin)
+
+    def build_backgrounds(self):
+        """Create backgrounds of the board, with its walls."""
+        # Create background from random texture, or plain in classic look.
+        # It is view sized, with and without grid
+        walls = self.board.walls
+        cell_w, cell_h = self.board.cell
+        if not settings.get_setting("classic"):
+            i = random.getrandbits(1) + 1
+            self.tile = scale_tile(resources.get_image(f"snake-tile{i}"),
+                                   self.board.cell)
+        else:
+            self.tile = get_surface((cell_w * 16, cell_h * 16), BGCOLOR, 255)
+        self.backgrounds = {
+            False: build_background(self.tile, self.board.rect.size),
+            True: build_background(self.tile, self.board.rect.size,
+                                   self.board.cell)}
+        self.period = self.tile.get_size()
+
+        # Walls are drawn once on the backgrounds. They don't repeat like
+        # the tile, so a scrolling view needs the whole board, plus a view
+        # to wrap around
+        if walls is not None:
+            board_size = (self.board.cols * cell_w, self.board.rows * cell_h)
+            size = self.board.rect.size
+            if self.board.scrolls:
+                size = (board_size[0] + size[0], board_size[1] + size[1])
+                self.period = board_size
+            for grid in self.backgrounds:
+                background = build_background(
+                    self.tile, size, self.board.cell if grid else None)
+                # Cached backgrounds are shared, draw on a copy
+                background = background.copy()
+                draw_walls(background, walls, self.board.size,
+                           self.board.cell,
+                           not settings.get_setting("classic"))
+                self.backgrounds[grid] = background
+
+    def reset_board(self):
+        """Put a new snake and apple on the board."""
+        self.sneik.reset()
+        self.apple.new(self.sneik)
+
+    def build_tinted_skin(self) -> dict:
+        """Return snake skin for other snakes, tinted. Empty in classic
+        look."""
+        if settings.get_setting("classic"):
+            return {}
+        _, snake_skin = split_sprites(resources.get_sprite("sheet"),
+                                      self.board.cell)
+        snake_skin.fill(BOT_TINT, special_flags=pygame.BLEND_RGB_MULT)
+        # On a board of its own: a snake takes random cells, and online
+        # games need the ones of the game board as they were seeded
+        template = Snake(Board(self.board.size, self.board.rect))
+        template.load_skin(snake_skin)
+        return template.skin
+
+    def toggle_autopilot(self):
+        """Let the autopilot play, or take the snake back. Games it played
+        don't make highscores."""
+        if self.autopilot is None:
+            self.autopilot = Autopilot(self.sneik)
+            self.autopiloted = True
+        else:
+            self.autopilot = None
 
     def pause(self):
         """Pause game."""
@@ -163,89 +356,131 @@ class SceneGame(SceneBase):
         """Unpause game."""
         pygame.mixer.music.unpause()
         self.is_paused = False
+        self.dirty = True
 
-    @staticmethod
-    def draw_grid(screen: pygame.Surface):
-        """Draw grid on screen, BLOCK sized rectangles."""
-        width, height = pygame.display.get_surface().get_size()
-        # Vertical lines
-        for i in range(width//BLOCK[0]):
-            pygame.draw.line(screen, WHITE,
-                             (i * BLOCK[0], 0), (i * BLOCK[0], height), 1)
-        # Horizontal lines
-        for i in range(height//BLOCK[1]):
-            pygame.draw.line(screen, WHITE,
-                             (0, i * BLOCK[1]), (width, i * BLOCK[1]), 1)
+    def take_crash_snapshots(self, screen: pygame.Surface):
+        """Keep what is under and over the blood around the crash.
+
+        Background is taken from the screen, so it must be already drawn.
+        Snake and apple are drawn on a transparent layer once, instead of
+        every frame while blood splashes."""
+        self.crash_area = self.blood.rect.clip(self.board.rect)
+        self.under_blood = screen.subsurface(self.crash_area).copy()
+
+        layer = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+        self.draw_objects(layer)
+        if self.sneik.skin and self.sneik.collision_ix is not None:
+            self.sneik.draw_bloody_piece(layer)
+        self.over_blood = layer.subsurface(self.crash_area).copy()
 
     def process_input(self, events, pressed_keys):
         for event in events:
             if not self.has_crashed:
+                if event.type != pygame.KEYDOWN:
+                    continue
+                action = settings.get_action(event.key)
                 if self.is_paused:
-                    if (event.type == pygame.KEYDOWN and
-                            event.key == settings.get_key("pause")):
+                    if action == "pause":
                         self.unpause()
                 else:
-                    if event.type == pygame.KEYDOWN:
-                        # Snake control, add new direction to queue
-                        if event.key in settings.get_key("direction"):
-                            self.sneik.queue_direction(
-                                event, settings.get_key("direction"))
-
-                        # UI control
-                        elif event.key == settings.get_key("grid"):
-                            self.show_grid = not self.show_grid
-                        elif event.key == settings.get_key("pause"):
-                            self.pause()
+                    # Snake control, add new direction to queue. It
+                    # takes the snake back from the autopilot
+                    if action in OPPOSITE:
+                        self.autopilot = None
+                        self.sneik.queue_direction(
+                            action, tag=latency.tag(event))
+
+                    # UI control
+                    elif action == "grid":
+                        self.show_grid = not self.show_grid
+                        self.dirty = True
+                    elif action == "pause":
+                        self.pause()
+                    elif action == "autopilot":
+                        self.toggle_autopilot()
 
     def update(self, now):
         if not self.is_paused and not self.has_crashed:
+            if self.autopilot is not None:
+                self.autopilot.steer([self.apple.pos], now)
+
             # Move snake
-            self.sneik.move(now)
+            if self.sneik.move(now):
+                self.board.follow(self.sneik.get_head())
+                self.dirty = True
 
             # Check if snake ate apple
             if self.sneik.get_head() == self.apple.pos:
-                resources.get_sound("eat").stop()
-                resources.get_sound("eat").play()
+                resources.play_sound("eat")
                 self.sneik.growing = True
-                self.apple.new(self.sneik.body)
+                if not self.apple.new(self.sneik):
+                    # Board is full, nothing left to play for
+                    self.switch_to_scene(SceneGameOver,
+                                         len(self.sneik) - 1, type(self),
+                                         not self.autopiloted)
 
             # Check if snake crashed
             if self.sneik.check_collision():
-                resources.get_sound("crash").play()
-                self.has_crashed = True
-                self.event_painted = False
-                self.timer = now
-                pygame.mixer.music.stop()
+                self.crash(now)
+
+        elif self.has_crashed:
+            # Add snake blood
+            self.blood.splash(now)
+
+            # Wait for 3 seconds from crash then switch to gameover scene
+            if now - self.timer > 3000:
+                score = len(self.sneik) - 2
+                self.switch_to_scene(SceneGameOver, score, type(self),
+                                     not self.autopiloted)
+
+        # Viewers only get what changed, if the game is broadcast
+        spectator.publish(self)
+
+    def crash(self, now: int):
+        """End the game, the snake of the player crashed."""
+        resources.play_sound("crash")
+        self.has_crashed = True
+        self.event_painted = False
+        self.timer = now
+        resources.stop_music()
 
-        # Wait for 3 seconds from crash then switch to gameover scene
-        elif self.has_crashed and now - self.timer > 3000:
-            score = len(self.sneik.body) - 2
-            self.switch_to_scene(lambda: SceneGameOver(score))
+        # Blood splashes around the center of its head
+        cell_w, cell_h = self.board.cell
+        head_x, head_y = self.board.to_screen(self.sneik.get_head())
+        self.blood = BloodSplatter(
+            (head_x + cell_w//2, head_y + cell_h//2), self.board.cell)
 
     def render(self, screen):
         width, height = pygame.display.get_surface().get_size()
         if not self.is_paused and (not self.has_crashed or
                                    (self.has_crashed and
                                     not self.event_painted)):
-            # Draw background
-            if not settings.get_setting("classic"):
-                screen.blit(self.background, (0, 0))
-            else:
-                # Classic look
-                screen.fill(BGCOLOR)
+            # Screen still shows the last frame if nothing changed
+            if not self.dirty:
+                return
+            self.dirty = False
+
+            # Draw background (with grid if shown), black around the board
+            screen.fill(BLACK)
+            scroll_x, scroll_y = self.board.scroll()
+            area = pygame.Rect(scroll_x % self.period[0],
+                               scroll_y % self.period[1],
+                               *self.board.rect.size)
+            screen.blit(self.backgrounds[self.show_grid], self.board.rect,
+                        area)
+            if self.has_crashed:
+                self.take_crash_snapshots(screen)
 
-            # Draw snake, apple, grid
-            self.sneik.draw(screen)
-            self.apple.draw(screen)
-            if self.show_grid:
-                self.draw_grid(screen)
+            self.draw_objects(screen)
 
             if self.has_crashed:
                 self.event_painted = True
 
         elif self.has_crashed:
-            # Add snake blood
-            self.sneik.draw_blood(screen)
+            # Blood over background and under snake, only around the crash
+            screen.blit(self.under_blood, self.crash_area)
+            self.blood.draw(screen, self.crash_area)
+            screen.blit(self.over_blood, self.crash_area)
 
         # Paint pause screen once
         elif not self.event_painted:
@@ -256,24 +491,336 @@ class SceneGame(SceneBase):
             # Show pause message
             font = resources.get_font("title100")
             text_surf, text_rect = render_text("Paused", font, WHITE)
-            text_rect.center = width//2, 250
+            text_rect.center = width//2, height//2 - 70
             screen.blit(text_surf, text_rect)
 
             font = resources.get_font("round30")
             text_surf, text_rect = render_text(
-                f"Score: {len(self.sneik.body) - 2}", font, WHITE)
-            text_rect.center = width//2, 330
+                f"Score: {len(self.sneik) - 2}", font, WHITE)
+            text_rect.center = width//2, height//2 + 10
             screen.blit(text_surf, text_rect)
             self.event_painted = True
 
+    def draw_objects(self, screen: pygame.Surface):
+        """Draw snake and apple."""
+        self.sneik.draw(screen)
+        self.apple.draw(screen)
+
+
+class SceneVersus(SceneGame):
+    """Scene with the snake of the player against bot snakes, on a shared
+    board.
+
+    Collisions of every snake are found through one occupancy grid, that
+    snakes update as they move. Once all of them moved, a head in a cell
+    with more than one piece has crashed, into itself or another snake.
+    Bots that crash are born again somewhere else."""
+    mode = VERSUS_MODE
+
+    def __init__(self):
+        super().__init__()
+        self.grid = None
+        self.bots = []
+        self.bot_skin = {}
+        self.apples = []
+
+    def build_board(self):
+        super().build_board()
+        self.grid = Occupancy(self.board)
+        self.bots = []
+        self.apples = [self.apple]
+
+        # Every bot uses the same tinted skin
+        self.bot_skin = self.build_tinted_skin()
+
+    def reset_board(self):
+        """Put the snakes of the player and the bots, and some apples, on
+        the board."""
+        self.grid.clear()
+        for snake in [self.sneik] + [bot.snake for bot in self.bots]:
+            snake.occupancy = None
+
+        # Bots and apples change with settings
+        count = settings.get_setting("bots")
+        while len(self.bots) < count:
+            snake = Snake(self.board)
+            snake.color = BOT_COLOR
+            snake.skin = self.bot_skin
+            self.bots.append(Bot(snake))
+        del self.bots[count:]
+        while len(self.apples) < 1 + count // 4:
+            self.apples.append(Apple(self.grid, self.board,
+                                     self.apple.sprite))
+        del self.apples[1 + count // 4:]
+
+        self.spawn(self.sneik)
+        for bot in self.bots:
+            # Same pace as the player, so they move on the same frames
+            bot.snake.timer = self.sneik.timer
+            self.spawn(bot.snake)
+        for apple in self.apples:
+            apple.new(self.grid)
+
+    def spawn(self, snake: Snake):
+        """Put a snake in a free cell of the board."""
+        snake.detach()
+        while True:
+            snake.reset()
+            if snake.get_head() not in self.grid:
+                break
+        snake.attach(self.grid)
+
+    def update(self, now):
+        if self.is_paused or self.has_crashed:
+            super().update(now)
+            return
+
+        self.move_snakes(now)
+        # Viewers follow the player, every tick like single player
+        spectator.publish(self)
+
+    def move_snakes(self, now: int):
+        """Move every snake whose time has come, then find out which
+        ones ate or crashed."""
+        if self.autopilot is not None:
+            self.autopilot.steer([apple.pos for apple in self.apples], now)
+
+        # Move snakes, the grid follows them
+        snakes = [self.sneik] + [bot.snake for bot in self.bots]
+        moved = [snake for snake in snakes if snake.move(now)]
+        if not moved:
+            return
+        self.board.follow(self.sneik.get_head())
+        self.dirty = True
+
+        # Check if snakes ate apples
+        apples = {apple.pos: apple for apple in self.apples}
+        for snake in moved:
+            apple = apples.get(snake.get_head())
+            if apple is not None:
+                snake.growing = True
+                apple.new(self.grid)
+                if snake is self.sneik:
+                    resources.play_sound("eat")
+
+        # Check if snakes crashed, only once all of them moved
+        crashed = [snake for snake in moved if snake.check_crowded()]
+        for bot in self.bots:
+            if bot.snake in crashed:
+                self.spawn(bot.snake)
+        if self.sneik in crashed:
+            # Find the crashed piece, if the snake bit itself
+            self.sneik.check_collision()
+            self.crash(now)
+            return
+
+        # Bots choose where to go on next tick
+        targets = [apple.pos for apple in self.apples]
+        for bot in self.bots:
+            bot.steer(targets, now)
+
+    def draw_objects(self, screen):
+        """Draw every snake and apple."""
+        for apple in self.apples:
+            apple.draw(screen)
+        for bot in self.bots:
+            bot.snake.draw(screen)
+        self.sneik.draw(screen)
+
+
+class SceneOnline(SceneGame):
+    """Scene with the snakes of players on other computers, see netcode.
+
+    Messages from the server are handled once a frame, the network runs
+    in its own thread. Crashed snakes are born again, the game goes on
+    until the player leaves with the pause key."""
+
+    def __init__(self):
+        super().__init__()
+        self.arena = None
+        self.player = 0
+        self.lockstep = True
+        # Length of the snake of the player, and if it was born again
+        self.length = 0
+        self.recenter = False
+        self.status = ""
+
+    def enter(self):
+        # Board comes from the server, don't build it from settings
+        SceneBase.enter(self)
+        self.arena = None
+        self.is_paused = False
+        self.has_crashed = False
+        self.show_grid = False
+        self.dirty = True
+        self.status = "Waiting for players..."
+
+    def exit(self):
+        super().exit()
+        netcode.disconnect()
+
+    def start(self, mode: int, player: int, players: int, size: Size,
+              seed: int, level: str):
+        """Build the game the server sent."""
+        walls = levels.load_level(level, size) if level else None
+        self.board = Board(size, pygame.display.get_surface().get_rect(),
+                           walls)
+        self.build_backgrounds()
+        self.arena = netcode.Arena(self.board, players, seed)
+        self.player = player
+        self.lockstep = mode == netcode.LOCKSTEP
+        if not self.lockstep:
+            # Bodies come from the server, the first snapshot has them all
+            for snake in self.arena.snakes:
+                snake.detach()
+            self.arena.lives = [-1] * players
+
+        if not settings.get_setting("classic"):
+            apple_skin, snake_skin = split_sprites(
+                resources.get_sprite("sheet"), self.board.cell)
+        else:
+            apple_skin, snake_skin = None, None
+        other_skin = self.build_tinted_skin()
+        for apple in self.arena.apples:
+            apple.sprite = apple_skin
+        for snake in self.arena.snakes:
+            snake.color = BOT_COLOR
+            snake.skin = other_skin
+        self.sneik = self.arena.snakes[player]
+        self.sneik.color = SNAKE_COLOR
+        self.sneik.skin = {}
+        self.sneik.load_skin(snake_skin)
+        self.length = len(self.sneik)
+        self.recenter = True
+        self.status = ""
+
+    def apply_snapshot(self, tick: int, apples: List[int], snakes: list):
+        """Update snakes and apples from the server."""
+        for player, (life, serial, length, cells,
+                     directions) in enumerate(snakes):
+            snake = self.arena.snakes[player]
+            if life != self.arena.lives[player]:
+                # Born again, whole body was sent
+                self.arena.lives[player] = life
+                snake.clear()
+                if player == self.player:
+                    self.reborn()
+            snake.sync(serial, length, cells, directions)
+        for apple, cell in zip(self.arena.apples, apples):
+            apple.pos = self.board.unpack(cell)
+        netcode.send_ack(tick)
+
+    def process_input(self, events, pressed_keys):
+        for event in events:
+            if event.type != pygame.KEYDOWN:
+                continue
+            action = settings.get_action(event.key)
+            if action in OPPOSITE and self.arena is not None:
+                netcode.send_input(action)
+            elif action == "grid":
+                self.show_grid = not self.show_grid
+                self.dirty = True
+            elif action == "pause":
+                # Leave the game
+                self.switch_to_scene(SceneMenu)
+
+    def update(self, now):
+        for message in netcode.receive():
+            self.dirty = True
+            if message[0] == "welcome":
+                self.start(*message[1:])
+            elif message[0] == "tick":
+                crashed = self.arena.tick([
+                    Snake.DIRECTIONS[code] if code != netcode.NO_INPUT
+                    else None for code in message[2]])
+                if self.player in crashed:
+                    self.reborn()
+            elif message[0] == "snapshot":
+                self.apply_snapshot(*message[1:])
+            elif message[0] == "error":
+                self.status = f"Couldn't connect: {message[1]}"
+            else:
+                self.status = "Disconnected from server"
+
+        if self.arena is not None and self.dirty:
+            if self.recenter:
+                self.board.center(self.sneik.get_head())
+                self.recenter = False
+            elif len(self.sneik) > self.length:
+                resources.play_sound("eat")
+            self.length = len(self.sneik)
+            self.board.follow(self.sneik.get_head())
+
+    def reborn(self):
+        """Snake of the player crashed, it was born again somewhere
+        else."""
+        resources.play_sound("crash")
+        self.recenter = True
+
+    def render(self, screen):
+        if self.arena is None:
+            if self.dirty:
+                screen.fill(BGCOLOR)
+                self.draw_status(screen)
+                self.dirty = False
+            return
+
+        dirty = self.dirty
+        super().render(screen)
+        if dirty:
+            self.draw_status(screen)
+
+    def draw_objects(self, screen):
+        """Draw every snake and apple."""
+        for apple in self.arena.apples:
+            apple.draw(screen)
+        for snake in self.arena.snakes:
+            if snake is not self.sneik:
+                snake.draw(screen)
+        self.sneik.draw(screen)
+
+    def draw_status(self, screen: pygame.Surface):
+        """Draw scores, network stats and connection status."""
+        width, height = pygame.display.get_surface().get_size()
+        font = resources.get_font("normal25")
+        if self.arena is not None:
+            stats = netcode.get_stats()
+            lines = [f"RTT {stats['rtt']:.0f} ms"
+                     f" (mean {stats['rtt_mean']:.0f}),"
+                     f" in {stats['in_rate']:.0f} B/s,"
+                     f" out {stats['out_rate']:.0f} B/s",
+                     "  ".join(f"P{player + 1}: {len(snake) - 2}"
+                               for player, snake
+                               in enumerate(self.arena.snakes))]
+            for i, line in enumerate(lines):
+                font.render_to(screen, (10, 10 + 30*i), line, WHITE)
+        if self.status:
+            text_surf, text_rect = render_text(
+                self.status, resources.get_font("round30"), WHITE)
+            text_rect.center = width//2, height//2
+            screen.blit(text_surf, text_rect)
+
 
 class SceneGameOver(SceneBase):
     """Game over scene."""
 
-    def __init__(self, score):
+    def __init__(self):
         super().__init__()
+        self.score = 0
+        self.game = SceneGame
+        self.record = False
+        self.initials = ""
+        self.joke = ""
+
+    def enter(self, score: int, game: type = SceneGame,
+              record: bool = True):
+        """Parameter game is the scene played, replayed from here. If
+        record is False the score can't be a highscore."""
+        super().enter()
         self.score = score
-        self.record = (self.score > settings.lower_highscore())
+        self.game = game
+        self.record = record and scores.qualifies(
+            self.score, settings.get_board(), game.mode)
         self.initials = ""
         self.joke = settings.get_joke()
 
@@ -281,15 +828,16 @@ class SceneGameOver(SceneBase):
                       pressed_keys: List[bool]):
         for event in events:
             if event.type == pygame.KEYDOWN:
+                action = settings.get_action(event.key)
                 if not self.record:
-                    if event.key == settings.get_key("accept"):
+                    if action == "accept":
                         # Replay
-                        self.switch_to_scene(SceneGame)
-                    elif event.key == settings.get_key("pause"):
+                        self.switch_to_scene(self.game)
+                    elif action == "pause":
                         # To menu
                         self.switch_to_scene(SceneMenu)
                 else:
-                    if event.key == settings.get_key("accept"):
+                    if action == "accept":
                         # confirm entered text
                         self.add_highscore()
                         self.record = False
@@ -304,21 +852,12 @@ class SceneGameOver(SceneBase):
         pass
 
     def add_highscore(self):
-        """Adds highscore to data and file."""
+        """Adds highscore to the database, and to the online leaderboard
+        if there is one."""
         date = str(datetime.date.today())
-        new_highscore = {"name": self.initials,
-                         "score": self.score,
-                         "date": date}
-
-        top = settings.get_highscores()
-        top.append(new_highscore)
-        # Highscore list is sorted by score (desc) and date (asc)
-        top.sort(key=lambda x: (-x['score'], x['date']))
-        if len(top) > 5:
-            top.pop()
-
-        # Save to file
-        settings.save_config()
+        scores.add_score(self.initials, self.score, date,
+                         settings.get_board(), self.game.mode)
+        leaderboard.notify()
 
     def render(self, screen: pygame.Surface):
         width, height = pygame.display.get_surface().get_size()
@@ -328,13 +867,13 @@ class SceneGameOver(SceneBase):
         text_surf, text_rect = render_text("YOU LOST",
                                            resources.get_font("title100"),
                                            WHITE)
-        text_rect.centerx, text_rect.y = width//2, 110
+        text_rect.centerx, text_rect.y = width//2, height//2 - 210
         screen.blit(text_surf, text_rect)
 
         text_surf, text_rect = render_text(f"Your score was {self.score}",
                                            resources.get_font("round30"),
                                            WHITE)
-        text_rect.centerx, text_rect.y = width//2, 270
+        text_rect.centerx, text_rect.y = width//2, height//2 - 50
         screen.blit(text_surf, text_rect)
 
         if not self.record:
@@ -345,24 +884,24 @@ class SceneGameOver(SceneBase):
             text_surf, text_rect = render_text(text,
                                                resources.get_font("round30"),
                                                WHITE)
-            text_rect.centerx, text_rect.y = width//2, 325
+            text_rect.centerx, text_rect.y = width//2, height//2 + 5
             screen.blit(text_surf, text_rect)
         else:
             # Highscore message
             text_surf, text_rect = render_text("New record!",
                                                resources.get_font("round30"),
                                                WHITE)
-            text_rect.centerx, text_rect.y = width//2, 345
+            text_rect.centerx, text_rect.y = width//2, height//2 + 25
             screen.blit(text_surf, text_rect)
 
             text_surf, text_rect = render_text("Enter your initials: ",
                                                resources.get_font("round30"),
                                                WHITE)
-            text_rect.centerx, text_rect.y = width//2-58, 420
+            text_rect.centerx, text_rect.y = width//2 - 58, height//2 + 100
             screen.blit(text_surf, text_rect)
 
             # Textbox
-            input_box = pygame.Rect(width//2+82, 415, 100, 35)
+            input_box = pygame.Rect(width//2 + 82, height//2 + 95, 100, 35)
             screen.fill(BLACK, input_box)
             resources.get_font("round30").render_to(
                 screen, (input_box.x+15, input_box.y+5), self.initials, WHITE)
@@ -377,66 +916,115 @@ class SceneGameOver(SceneBase):
 
 class SceneSettings(SceneBase):
     """Settings scene."""
+    track = "menu-music.ogg"
 
     def __init__(self):
         super().__init__()
         self.index = 0
-        self.sound = settings.get_setting("sound")
-        self.music = settings.get_setting("music")
-        self.classic = settings.get_setting("classic")
-        self.options = ["Sound Effects", "Music", "Graphics",
+        self.sound = 0
+        self.music = 0
+        self.classic = False
+        self.frame_mode = 1
+        self.board = 1
+        # Levels for the board size, no walls first
+        self.levels = [""]
+        self.level = 0
+        self.bots = 2
+        self.options = ["Sound Effects", "Music", "Graphics", "Frame Rate",
+                        "Board Size", "Level", "Versus Bots",
                         "Change Controls", "Save and Return to Main Menu"]
 
         # Create sliders
         self.sound_slider = Slider(self.sound, 250)
         self.music_slider = Slider(self.music, 250)
 
+    def enter(self):
+        super().enter()
+        # Edit a copy of current settings
+        self.index = 0
+        self.sound = settings.get_setting("sound")
+        self.music = settings.get_setting("music")
+        self.classic = settings.get_setting("classic")
+        frame_mode = (settings.get_setting("fps"),
+                      settings.get_setting("pacing"))
+        self.frame_mode = (FRAME_MODES.index(frame_mode)
+                           if frame_mode in FRAME_MODES else 1)
+        board = settings.get_board()
+        self.board = (BOARD_SIZES.index(board)
+                      if board in BOARD_SIZES else 1)
+        self.find_levels(settings.get_setting("level"))
+        bots = settings.get_setting("bots")
+        self.bots = BOT_COUNTS.index(bots) if bots in BOT_COUNTS else 2
+
     def process_input(self, events, pressed_keys):
         for event in events:
             if event.type == pygame.KEYDOWN:
+                action = settings.get_action(event.key)
                 # Select option
-                if event.key == settings.get_key("up"):
+                if action == "up":
                     self.index = (len(self.options)-1 if self.index == 0
                                   else self.index-1)
-                    resources.get_sound("menu-sel").stop()
-                    resources.get_sound("menu-sel").play()
-                elif event.key == settings.get_key("down"):
+                    resources.play_sound("menu-sel")
+                elif action == "down":
                     self.index = (0 if self.index == len(self.options)-1
                                   else self.index+1)
-                    resources.get_sound("menu-sel").stop()
-                    resources.get_sound("menu-sel").play()
+                    resources.play_sound("menu-sel")
 
                 # Modify option
-                elif event.key == settings.get_key("left"):
+                elif action == "left":
                     if self.index == 0:
                         self.sound -= (0.1 if self.sound >= 0.1 else 0)
                         self.test_volume(self.sound)
                     elif self.index == 1:
                         self.music -= (0.1 if self.music >= 0.1 else 0)
-                        self.test_volume(self.music)
+                        pygame.mixer.music.set_volume(self.music)
                     elif self.index == 2:
-                        resources.get_sound("menu-sel").stop()
-                        resources.get_sound("menu-sel").play()
+                        resources.play_sound("menu-sel")
                         self.classic = not self.classic
-
-                elif event.key == settings.get_key("right"):
+                    elif self.index == 3:
+                        resources.play_sound("menu-sel")
+                        self.frame_mode = ((self.frame_mode - 1) %
+                                           len(FRAME_MODES))
+                    elif self.index == 4:
+                        resources.play_sound("menu-sel")
+                        self.board = (self.board - 1) % len(BOARD_SIZES)
+                        self.find_levels(self.levels[self.level])
+                    elif self.index == 5:
+                        resources.play_sound("menu-sel")
+                        self.level = (self.level - 1) % len(self.levels)
+                    elif self.index == 6:
+                        resources.play_sound("menu-sel")
+                        self.bots = (self.bots - 1) % len(BOT_COUNTS)
+
+                elif action == "right":
                     if self.index == 0:
                         self.sound += (0.1 if self.sound <= 0.9 else 0)
                         self.test_volume(self.sound)
                     elif self.index == 1:
                         self.music += (0.1 if self.music <= 0.9 else 0)
-                        self.test_volume(self.music)
+                        pygame.mixer.music.set_volume(self.music)
                     elif self.index == 2:
-                        resources.get_sound("menu-sel").stop()
-                        resources.get_sound("menu-sel").play()
+                        resources.play_sound("menu-sel")
                         self.classic = not self.classic
-
-                elif (event.key == settings.get_key("accept") and
-                      2 < self.index < 5):
-                    resources.get_sound("menu-accept").stop()
-                    resources.get_sound("menu-accept").play()
+                    elif self.index == 3:
+                        resources.play_sound("menu-sel")
+                        self.frame_mode = ((self.frame_mode + 1) %
+                                           len(FRAME_MODES))
+                    elif self.index == 4:
+                        resources.play_sound("menu-sel")
+                        self.board = (self.board + 1) % len(BOARD_SIZES)
+                        self.find_levels(self.levels[self.level])
+                    elif self.index == 5:
+                        resources.play_sound("menu-sel")
+                        self.level = (self.level + 1) % len(self.levels)
+                    elif self.index == 6:
+                        resources.play_sound("menu-sel")
+                        self.bots = (self.bots + 1) % len(BOT_COUNTS)
+
+                elif action == "accept" and 6 < self.index < 9:
+                    resources.play_sound("menu-accept")
                     # Change controls
-                    if self.index == 3:
+                    if self.index == 7:
                         self.save_config()
                         self.switch_to_scene(SceneSettingsControls)
 
@@ -445,18 +1033,27 @@ class SceneSettings(SceneBase):
                         self.save_config()
                         self.switch_to_scene(SceneMenu)
 
+    def find_levels(self, level: str):
+        """List levels for the chosen board size, selecting the given one
+        if it is there."""
+        self.levels = [""] + levels.get_levels(BOARD_SIZES[self.board])
+        self.level = self.levels.index(level) if level in self.levels else 0
+
     def test_volume(self, option: float):
-        """Play a sound at the given volume.."""
-        test_audio = resources.get_sound("eat")
-        test_audio.stop()
-        test_audio.set_volume(option)
-        test_audio.play()
+        """Play a sound at the given volume."""
+        resources.play_sound("eat", option)
 
     def save_config(self):
         """Apply and save new settings."""
         settings.set_settings("sound", round(self.sound, 1))
         settings.set_settings("music", round(self.music, 1))
         settings.set_settings("classic", self.classic)
+        fps, pacing = FRAME_MODES[self.frame_mode]
+        settings.set_settings("fps", fps)
+        settings.set_settings("pacing", pacing)
+        settings.set_settings("board", list(BOARD_SIZES[self.board]))
+        settings.set_settings("level", self.levels[self.level])
+        settings.set_settings("bots", BOT_COUNTS[self.bots])
         settings.save_config()
 
         # Set volumes
@@ -467,7 +1064,7 @@ class SceneSettings(SceneBase):
         pass
 
     def render(self, screen: pygame.Surface):
-        width = pygame.display.get_surface().get_width()
+        width, height = pygame.display.get_surface().get_size()
         screen.fill(BGCOLOR)
 
         font = resources.get_font("round50")
@@ -475,12 +1072,13 @@ class SceneSettings(SceneBase):
         text_rect.centerx, text_rect.y = width//2, 50
         screen.blit(text_surf, text_rect)
 
-        pos_y = 180
-        for i, option in enumerate(self.options):
-            # Leave more space for last option
-            if i == len(self.options) - 1:
-                pos_y += 60
+        # Vertical position of every option
+        rows_y = [height//2 - 190 + 48*i for i in range(len(self.options))]
+        # Leave more space for last option
+        rows_y[-1] += 40
+        left_x, right_x = width//2 - 250, width//2 + 50
 
+        for i, option in enumerate(self.options):
             if i == self.index:
                 # Selected
                 color = APPLE_COLOR
@@ -491,13 +1089,13 @@ class SceneSettings(SceneBase):
                 font = resources.get_font("round30")
 
             text_surf, text_rect = render_text(option, font, color)
-            text_rect.x, text_rect.y = (150, pos_y+60*i)
+            text_rect.x, text_rect.y = (left_x, rows_y[i])
             screen.blit(text_surf, text_rect)
 
         # Sound slider
         self.sound_slider.percent = self.sound
-        self.sound_slider.rect.x = 450
-        self.sound_slider.rect.y = 180
+        self.sound_slider.rect.x = right_x
+        self.sound_slider.rect.y = rows_y[0]
         if self.index == 0:
             self.sound_slider.color = APPLE_COLOR
         else:
@@ -506,8 +1104,8 @@ class SceneSettings(SceneBase):
 
         # Music slider
         self.music_slider.percent = self.music
-        self.music_slider.rect.x = 450
-        self.music_slider.rect.y = 240
+        self.music_slider.rect.x = right_x
+        self.music_slider.rect.y = rows_y[1]
         if self.index == 1:
             self.music_slider.color = APPLE_COLOR
         else:
@@ -518,44 +1116,92 @@ class SceneSettings(SceneBase):
         font = resources.get_font("round30")
         if self.classic:
             text_surf, text_rect = render_text("Classic /", font, APPLE_COLOR)
-            text_rect.x, text_rect.y = 465, 300
+            text_rect.x, text_rect.y = right_x + 15, rows_y[2]
         else:
             text_surf, text_rect = render_text("/ Modern", font, APPLE_COLOR)
-            text_rect.x, text_rect.y = 564, 300
+            text_rect.x, text_rect.y = right_x + 114, rows_y[2]
+        screen.blit(text_surf, text_rect)
+
+        # Frame rate
+        fps, pacing = FRAME_MODES[self.frame_mode]
+        if pacing == "uncapped":
+            text = "Unlocked"
+        elif pacing == "precise":
+            text = f"{fps} fps precise"
+        else:
+            text = f"{fps} fps"
+        text_surf, text_rect = render_text(text, font, APPLE_COLOR)
+        text_rect.x, text_rect.y = right_x, rows_y[3]
+        screen.blit(text_surf, text_rect)
+
+        # Board size
+        cols, rows = BOARD_SIZES[self.board]
+        text_surf, text_rect = render_text(f"{cols} x {rows}", font,
+                                           APPLE_COLOR)
+        text_rect.x, text_rect.y = right_x, rows_y[4]
+        screen.blit(text_surf, text_rect)
+
+        # Level
+        level = self.levels[self.level] or "None"
+        text_surf, text_rect = render_text(level.capitalize(), font,
+                                           APPLE_COLOR)
+        text_rect.x, text_rect.y = right_x, rows_y[5]
+        screen.blit(text_surf, text_rect)
+
+        # Bots in versus mode
+        text_surf, text_rect = render_text(str(BOT_COUNTS[self.bots]), font,
+                                           APPLE_COLOR)
+        text_rect.x, text_rect.y = right_x, rows_y[6]
         screen.blit(text_surf, text_rect)
 
 
 class SceneSettingsControls(SceneBase):
     """Change controls scene."""
+    track = "menu-music.ogg"
 
     def __init__(self):
         super().__init__()
         self.index = 0
         self.changing = False
         self.options = ["Up", "Down", "Left", "Right", "Grid", "Pause",
-                        "Accept", "Save and Return to Main Menu"]
+                        "Autopilot", "Accept",
+                        "Save and Return to Main Menu"]
+        self.keys = {}
+        self.bound = {}
+        self.key_names = {}
+
+    def enter(self):
+        super().enter()
+        # Edit a copy of current key bindings
+        self.index = 0
+        self.changing = False
         self.keys = settings.get_keybindings()
+        self.compile_keys()
+
+    def compile_keys(self):
+        """Update the keycode -> action table of the edited bindings."""
+        self.bound = settings.compile_keymap(self.keys)
+        self.key_names = {v: pygame.key.name(k)
+                          for k, v in self.bound.items()}
 
     def process_input(self, events, pressed_keys):
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if not self.changing:
+                    action = settings.get_action(event.key)
                     # Select option
-                    if event.key == settings.get_key("up"):
+                    if action == "up":
                         self.index = (len(self.options)-1 if self.index == 0
                                       else self.index-1)
-                        resources.get_sound("menu-sel").stop()
-                        resources.get_sound("menu-sel").play()
-                    elif event.key == settings.get_key("down"):
+                        resources.play_sound("menu-sel")
+                    elif action == "down":
                         self.index = (0 if self.index == len(self.options)-1
                                       else self.index+1)
-                        resources.get_sound("menu-sel").stop()
-                        resources.get_sound("menu-sel").play()
+                        resources.play_sound("menu-sel")
 
                     # Modify option
-                    elif event.key == settings.get_key("accept"):
-                        resources.get_sound("menu-accept").stop()
-                        resources.get_sound("menu-accept").play()
+                    elif action == "accept":
+                        resources.play_sound("menu-accept")
                         # Enter 'change key' mode
                         if self.index != len(self.options) - 1:
                             self.changing = True
@@ -572,24 +1218,19 @@ class SceneSettingsControls(SceneBase):
         """Change the key for a certain action."""
         action = self.options[self.index].lower()
 
-        # Currently used keys
-        banned_keys = [v for k, v in self.keys.items() if k != "direction"]
-        banned_keys.extend([int(k) for k, v in self.keys['direction'].items()])
-
         # Do nothing if the pressed key is already being used
-        if key not in banned_keys:
+        if key not in self.bound:
             if 0 <= self.index <= 3:
                 # Change a direction key
-                old_key = {v: k for k, v in self.keys['direction'].items()
-                           if v == action}
-                del self.keys['direction'][old_key[action]]
+                old_key = {v: k for k, v in self.bound.items()}[action]
+                del self.keys['direction'][old_key]
                 self.keys['direction'][key] = action
 
             else:
                 # Change an action key
-                if key not in banned_keys:
-                    self.keys[action] = key
+                self.keys[action] = key
 
+            self.compile_keys()
             self.changing = False
 
     def save_config(self):
@@ -601,18 +1242,18 @@ class SceneSettingsControls(SceneBase):
         pass
 
     def render(self, screen: pygame.Surface):
-        width = pygame.display.get_surface().get_width()
+        width, height = pygame.display.get_surface().get_size()
 
         screen.fill(BGCOLOR)
 
-        text_surf, text_rect = render_text(f"Change Controls",
+        text_surf, text_rect = render_text("Change Controls",
                                            resources.get_font("round50"),
                                            WHITE)
         text_rect.centerx, text_rect.y = width//2, 50
         screen.blit(text_surf, text_rect)
 
         # Display key list
-        pos_y = 150
+        pos_y = height//2 - 170
         for i, option in enumerate(self.options):
             # Leave more space for last option
             if i == len(self.options) - 1:
@@ -628,52 +1269,49 @@ class SceneSettingsControls(SceneBase):
                 font = resources.get_font("round30")
 
             text_surf, text_rect = render_text(option, font, color)
-            text_rect.x, text_rect.y = (150, pos_y+45*i)
+            text_rect.x, text_rect.y = (width//2 - 250, pos_y+45*i)
             screen.blit(text_surf, text_rect)
 
         # Display assigned key
-        pos_y = 150
+        pos_y = height//2 - 170
         font = resources.get_font("round30")
         for i, option in enumerate(self.options[:-1]):
-            action = option.lower()
-            if 0 <= i <= 3:
-                # Direction key
-                key_par = {v: k for k, v in self.keys['direction'].items()
-                           if v == action}
-                key_name = pygame.key.name(int(key_par[action]))
-
-            else:
-                # Action key
-                key_name = pygame.key.name(self.keys[action])
+            key_name = self.key_names[option.lower()]
 
             # Changing key bind
             if self.changing and i == self.index:
                 text_surf, text_rect = render_text(
                     "Press a key", font, APPLE_COLOR)
-                text_rect.x, text_rect.y = (550, pos_y+45*i)
+                text_rect.x, text_rect.y = (width//2 + 150, pos_y+45*i)
                 screen.blit(text_surf, text_rect)
             else:
                 # Display key name
                 text_surf, text_rect = render_text(
                     "- - - - - - - - - - - - - -       " + key_name, font,
                     WHITE)
-                text_rect.x, text_rect.y = (270, pos_y+45*i)
+                text_rect.x, text_rect.y = (width//2 - 130, pos_y+45*i)
                 screen.blit(text_surf, text_rect)
 
 
 class SceneHighScores(SceneBase):
     """Highscores scene."""
+    track = "menu-music.ogg"
 
     def __init__(self):
         super().__init__()
+        self.highscores = []
+
+    def enter(self):
+        super().enter()
+        # Top of current board size, read once per visit
+        self.highscores = scores.get_top(settings.get_board())
 
     def process_input(self, events, pressed_keys):
         for event in events:
-            if event.type == pygame.KEYDOWN:
-                if event.key == settings.get_key("accept"):
-                    resources.get_sound("menu-accept").stop()
-                    resources.get_sound("menu-accept").play()
-                    self.switch_to_scene(SceneMenu)
+            if (event.type == pygame.KEYDOWN and
+                    settings.get_action(event.key) == "accept"):
+                resources.play_sound("menu-accept")
+                self.switch_to_scene(SceneMenu)
 
     def update(self, now: int):
         pass
@@ -683,21 +1321,21 @@ class SceneHighScores(SceneBase):
 
         screen.fill(BGCOLOR)
 
-        text_surf, text_rect = render_text(f"Highscores",
+        cols, rows = settings.get_board()
+        text_surf, text_rect = render_text(f"Highscores {cols}x{rows}",
                                            resources.get_font("round50"),
                                            WHITE)
         text_rect.centerx, text_rect.y = width//2, 50
         screen.blit(text_surf, text_rect)
 
         # Display highscore list
-        highscores = settings.get_highscores()
-        for i, highscore in enumerate(highscores):
+        for i, highscore in enumerate(self.highscores):
             color = (200 - i*30, 200 - i*20, 200 - i*30)
             text = (f"{i+1} ___ {highscore['name']:>3} _____ "
                     f"{highscore['score']:3} _____ {highscore['date']} ")
             text_surf, text_rect = render_text(
                 text, resources.get_font("mono30"), color)
-            text_rect.x, text_rect.y = 75, 150+i*50
+            text_rect.x, text_rect.y = width//2 - 325, height//2 - 170 + i*50
             screen.blit(text_surf, text_rect)
 
         text = "Return to Main Menu"
@@ -709,61 +1347,56 @@ class SceneHighScores(SceneBase):
 
 class SceneMenu(SceneBase):
     """Scene index of scenes."""
+    track = "menu-music.ogg"
 
     def __init__(self):
         super().__init__()
-        self.options = [("Play", lambda: SceneTransition(SceneGame)),
-                        ("Settings", lambda: SceneTransition(SceneSettings)),
-                        ("Highscores",
-                         lambda: SceneTransition(SceneHighScores)),
-                        ("Quit", SceneExit)]
+        # Option name, scene and its arguments
+        self.options = [("Play", SceneTransition, (SceneGame,)),
+                        ("Versus", SceneTransition, (SceneVersus,)),
+                        ("Settings", SceneTransition, (SceneSettings,)),
+                        ("Highscores", SceneTransition, (SceneHighScores,)),
+                        ("Quit", SceneExit, ())]
         self.selected = False
         self.index = 0
-        self.play_music()
         i = random.getrandbits(1) + 1
         i = 1
         self.background = ParaBackground(resources.get_image(f"menu-bg{i}"),
                                          resources.get_image(f"menu-bg{i}b"))
 
-    @staticmethod
-    def play_music():
-        """Play annoying music."""
-        resources.load_music("menu-music.ogg")
-        pygame.mixer.music.play(-1)
+    def enter(self):
+        super().enter()
+        self.selected = False
+        self.index = 0
 
     def process_input(self, events, pressed_keys):
         for event in events:
             if event.type == pygame.KEYDOWN:
-                if event.key == settings.get_key("up"):
+                action = settings.get_action(event.key)
+                if action == "up":
                     self.index = (len(self.options)-1 if self.index == 0
                                   else self.index-1)
-                    resources.get_sound("menu-sel").stop()
-                    resources.get_sound("menu-sel").play()
-                elif event.key == settings.get_key("down"):
+                    resources.play_sound("menu-sel")
+                elif action == "down":
                     self.index = (0 if self.index == len(self.options)-1
                                   else self.index+1)
-                    resources.get_sound("menu-sel").stop()
-                    resources.get_sound("menu-sel").play()
-                elif event.key == settings.get_key("accept"):
-                    resources.get_sound("menu-accept").stop()
-                    resources.get_sound("menu-accept").play()
+                    resources.play_sound("menu-sel")
+                elif action == "accept":
+                    resources.play_sound("menu-accept")
                     self.selected = True
+            elif self.selected and resources.is_sound_end(event, "ui"):
+                # Accept sound finished
+                _, scene, args = self.options[self.index]
+                self.switch_to_scene(scene, *args)
 
     def update(self, now):
-        # Wait for sound to stop playing
-        if self.selected and not pygame.mixer.get_busy():
-            self.switch_to_scene(self.options[self.index][1])
-        else:
-            # Move background according to its speed
-            if now - self.background.timer >= 1000.0/self.background.vel:
-                self.background.timer = now
-                self.background.move()
+        # Move background according to its speed
+        self.background.move(now)
 
     def render(self, screen):
-        width = pygame.display.get_surface().get_width()
-        screen.fill(BGCOLOR)
+        width, height = pygame.display.get_surface().get_size()
 
-        # Draw background
+        # Draw background, it covers the whole screen
         self.background.draw(screen)
 
         # Semitransparent surface behind title
@@ -778,7 +1411,7 @@ class SceneMenu(SceneBase):
         rd_rect.centerx, rd_rect.y = width//2, 60
         screen.blit(rd_text, rd_rect)
 
-        pos_y = 280
+        pos_y = height//2 - 40
         # Semitransparent surface behind selected option
         overlay = get_surface((width, 50), BLACK, 150)
         overlay_rect = overlay.get_rect()
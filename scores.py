@@ -0,0 +1,142 @@
+"""Highscore database, every highscore of every board size and mode."""
+import sqlite3
+from uuid import uuid4
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional
+
+from consts import SCORES_FILE, TOP_SIZE, DEFAULT_MODE, Size
+
+connection = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    board TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_top
+    ON scores (board, mode, score DESC, date);
+CREATE INDEX IF NOT EXISTS scores_player
+    ON scores (name, score DESC, date);
+CREATE TABLE IF NOT EXISTS outbox (
+    score_id INTEGER PRIMARY KEY REFERENCES scores (id),
+    uid TEXT NOT NULL
+);
+"""
+# Highscores are sorted by score (desc) and date (asc), older first
+ORDER = "ORDER BY score DESC, date, id"
+
+
+def board_key(board: Size) -> str:
+    """Return the name of a board size, like '25x20'."""
+    return f"{board[0]}x{board[1]}"
+
+
+def _rows_to_dicts(rows: Iterable[sqlite3.Row]) -> List[Dict]:
+    """Return rows as dictionaries, like highscores in old config files."""
+    return [dict(row) for row in rows]
+
+
+# GETS ======================================================================
+def get_top(board: Size, mode: str = DEFAULT_MODE,
+            count: int = TOP_SIZE) -> List[Dict]:
+    """Return the best highscores of a board size and mode."""
+    return _rows_to_dicts(connection.execute(
+        f"SELECT name, score, date FROM scores WHERE board = ? AND mode = ?"
+        f" {ORDER} LIMIT ?", (board_key(board), mode, count)))
+
+
+def get_history(board: Size = None, mode: str = None) -> List[Dict]:
+    """Return every highscore, newest first. Filter by board size and
+    mode if given."""
+    query = "SELECT board, mode, name, score, date FROM scores"
+    filters, values = [], []
+    if board is not None:
+        filters.append("board = ?")
+        values.append(board_key(board))
+    if mode is not None:
+        filters.append("mode = ?")
+        values.append(mode)
+    if filters:
+        query += " WHERE " + " AND ".join(filters)
+    return _rows_to_dicts(connection.execute(
+        query + " ORDER BY date DESC, id DESC", values))
+
+
+def get_player(name: str, count: int = TOP_SIZE) -> List[Dict]:
+    """Return best highscores of a player, in any board size and mode."""
+    return _rows_to_dicts(connection.execute(
+        f"SELECT board, mode, name, score, date FROM scores WHERE name = ?"
+        f" {ORDER} LIMIT ?", (name, count)))
+
+
+def get_rank(score: int, board: Size, mode: str = DEFAULT_MODE,
+             count: int = TOP_SIZE) -> Optional[int]:
+    """Return position a new score would get in the top, None if it
+    doesn't get in.
+
+    Only the scores of the top are read, through the index. Ties go
+    after older highscores."""
+    top = [-row[0] for row in connection.execute(
+        f"SELECT score FROM scores WHERE board = ? AND mode = ?"
+        f" {ORDER} LIMIT ?", (board_key(board), mode, count))]
+    rank = bisect_right(top, -score)
+    return rank if rank < count and score > 0 else None
+
+
+def qualifies(score: int, board: Size, mode: str = DEFAULT_MODE) -> bool:
+    """Return True if score gets into the top of its board size and mode."""
+    return get_rank(score, board, mode) is not None
+
+
+# SETS ======================================================================
+def add_score(name: str, score: int, date: str, board: Size,
+              mode: str = DEFAULT_MODE):
+    """Save a new highscore, and queue it in the outbox for the online
+    leaderboard.
+
+    The outbox lives in the database, so nothing is lost if the game is
+    closed before it is sent. Every entry gets a unique id, so sending
+    it again is harmless."""
+    with connection:
+        cursor = connection.execute(
+            "INSERT INTO scores (name, score, date, board, mode)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (name, score, date, board_key(board), mode))
+        connection.execute("INSERT INTO outbox (score_id, uid) VALUES (?, ?)",
+                           (cursor.lastrowid, uuid4().hex))
+
+
+def add_scores(entries: Iterable[tuple]):
+    """Save highscores (name, score, date, board, mode) in one
+    transaction."""
+    with connection:
+        connection.executemany(
+            "INSERT INTO scores (name, score, date, board, mode)"
+            " VALUES (?, ?, ?, ?, ?)",
+            ((name, score, date, board_key(board), mode)
+             for name, score, date, board, mode in entries))
+
+
+# I/O =======================================================================
+def load_scores(legacy: Dict[str, List[Dict]] = None):
+    """Open highscore database, creating it if needed.
+
+    Highscores from old config files, by board size name, are imported
+    into a new database."""
+    global connection
+
+    connection = sqlite3.connect(SCORES_FILE)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    empty = connection.execute("SELECT 1 FROM scores LIMIT 1").fetchone()
+    if legacy and empty is None:
+        print(f"Importing highscores into {SCORES_FILE}...", end=" ")
+        add_scores((entry['name'], entry['score'], entry['date'],
+                    tuple(int(side) for side in board.split("x")),
+                    DEFAULT_MODE)
+                   for board, top in legacy.items() for entry in top)
+        print("Done.")
@@ -0,0 +1,175 @@
+"""Screenshots of the scenes, for the docs.
+
+Every scene is visited without a window and taken to a scripted state,
+pressing keys like a player would, then saved full size and as a
+thumbnail, numbered in the order of the docs:
+
+    python screenshots.py --out docs/screenshots
+
+Scenes share the display, so they are drawn one after another. Saving
+and scaling the images is done by a pool of processes meanwhile."""
+import os
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Iterator, Tuple
+
+import pygame
+
+from export import Layout, SIZE, copy_frame, get_layout, rebuild
+
+# Width of the thumbnails, they keep the aspect of the screen
+THUMBNAIL = 350
+# Frames per game second while playing
+FPS = 30
+
+
+def save_shot(pixels: bytes, layout: Layout, path: str, thumbnail: str,
+              width: int) -> str:
+    """Save copied pixels as a PNG image, and a smaller copy of it.
+    Return file name of the image."""
+    surface = rebuild(pixels, layout)
+    pygame.image.save(surface, path)
+    size = (width, round(width * surface.get_height() / surface.get_width()))
+    pygame.image.save(pygame.transform.smoothscale(surface, size), thumbnail)
+    return os.path.basename(path)
+
+
+def press(scene, key: int, text: str = ""):
+    """Press a key in a scene, text is what it types."""
+    scene.process_input([pygame.event.Event(pygame.KEYDOWN, key=key,
+                                            unicode=text, mod=0)], [])
+
+
+def play(scene, seconds: float, now: float) -> float:
+    """Let the autopilot play a game scene for some game seconds, without
+    drawing. Return game time at the end."""
+    for _ in range(round(seconds * FPS)):
+        now += 1000 / FPS
+        scene.update(now)
+    scene.dirty = True
+    return now
+
+
+def scripts(screen: pygame.Surface, seed: int) -> Iterator[Tuple[int, str]]:
+    """Take scenes to the states of the screenshots, and draw them. Yield
+    number and name of every screenshot once it is on the screen."""
+    import settings
+    from autopilot import Autopilot
+    from scenes import (SceneMenu, SceneGame, SceneGameOver, SceneSettings,
+                        SceneSettingsControls, SceneHighScores)
+
+    # Backgrounds and puns are random, the same ones every time
+    random.seed(seed)
+    now = 1000.0
+
+    scene = SceneMenu.visit()
+    for _ in range(FPS):
+        now += 1000 / FPS
+        scene.update(now)
+    scene.render(screen)
+    yield 1, "menu"
+
+    # Modern look first, classic afterwards, then as it was
+    classic = settings.get_setting("classic")
+    settings.set_settings("classic", False)
+    scene = SceneGame.visit()
+    scene.board.rng.seed(seed)
+    scene.reset_board()
+    scene.board.center(scene.sneik.get_head())
+    # Whole searches, so the game doesn't depend on the machine
+    scene.autopilot = Autopilot(scene.sneik, budget=1.0)
+    now = play(scene, 60, now)
+    scene.render(screen)
+    yield 2, "game"
+
+    scene.pause()
+    scene.render(screen)
+    score = len(scene.sneik) - 2
+    yield 4, "pause"
+
+    scene.unpause()
+    scene.exit()
+    settings.set_settings("classic", True)
+    scene = SceneGame.visit()
+    scene.autopilot = Autopilot(scene.sneik, budget=1.0)
+    now = play(scene, 20, now)
+    scene.render(screen)
+    yield 3, "classic"
+    scene.exit()
+    settings.set_settings("classic", classic)
+
+    scene = SceneGameOver.visit(score, SceneGame)
+    for letter in "alu":
+        press(scene, ord(letter), letter)
+    scene.render(screen)
+    yield 5, "game over"
+
+    scene = SceneHighScores.visit()
+    scene.render(screen)
+    yield 6, "highscores"
+
+    scene = SceneSettings.visit()
+    scene.render(screen)
+    yield 7, "settings"
+
+    # Changing the key of Accept
+    scene = SceneSettingsControls.visit()
+    for _ in range(scene.options.index("Accept")):
+        press(scene, settings.get_key("down"))
+    press(scene, settings.get_key("accept"))
+    scene.render(screen)
+    yield 8, "controls"
+
+
+def shoot(args: argparse.Namespace):
+    """Save screenshots of every scene."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import settings
+    import resources
+    import scores
+
+    pygame.init()
+    screen = pygame.display.set_mode(SIZE)
+    resources.load_assets()
+    settings.load_config()
+    scores.load_scores()
+    settings.load_jokes()
+    # Not saved, settings are only written from the settings scene
+    settings.set_settings("board", [int(side)
+                                    for side in args.board.split("x")])
+    settings.set_settings("level", "")
+
+    os.makedirs(args.out, exist_ok=True)
+    layout = get_layout(screen)
+    start = perf_counter()
+    with ProcessPoolExecutor(args.workers) as pool:
+        shots = []
+        for number, name in scripts(screen, args.seed):
+            shots.append((name, pool.submit(
+                save_shot, copy_frame(screen), layout,
+                os.path.join(args.out, f"{number}.png"),
+                os.path.join(args.out, f"{number}_tn.png"), args.width)))
+        drawn = perf_counter() - start
+        for name, shot in shots:
+            print(f"{shot.result()}: {name}.")
+    pygame.quit()
+    print(f"{len(shots)} screenshots in {perf_counter() - start:.1f} s,"
+          f" {drawn:.1f} s drawing them.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default=os.path.join("docs", "screenshots"),
+                        help="directory of the screenshots")
+    parser.add_argument("--board", default="25x20",
+                        help="board size, like 25x20")
+    parser.add_argument("--width", type=int, default=THUMBNAIL,
+                        help="width of the thumbnails")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the games")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes saving images")
+    shoot(parser.parse_args())
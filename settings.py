@@ -1,40 +1,69 @@
-"""Save and load game data (configuration, controls, highscores, jokes)."""
+"""Save and load game data (configuration, controls, jokes)."""
+import os
 import json
+import mmap
+from array import array
 from copy import deepcopy
 import random
-from typing import Any, List
+from typing import Any, Dict, List
 
 import pygame
 
 import resources
-from consts import CONFIG_FILE, PUN_FILE, DEFAULT_SETTINGS, DEFAULT_KEYMAPPING
+from consts import (CONFIG_FILE, PUN_FILE, PUN_INDEX, DEFAULT_SETTINGS,
+                    DEFAULT_KEYMAPPING, Size)
 
 settings = DEFAULT_SETTINGS
 keymapping = DEFAULT_KEYMAPPING
-highscores = []  # Ordered by score descending and date ascending
-jokes = []
+# Compiled from keymapping: keycode -> action and action -> keycode
+keyactions = {}
+actionkeys = {}
+# Highscores of old config files by board size, they are moved to the
+# highscore database
+legacy_highscores = {}
+# Pun file and its offset table, memory mapped
+jokes = None
+joke_offsets = None
+FALLBACK_JOKE = "There are no snakes in my boot :("
 
 
 # GETS ======================================================================
 def get_setting(option: str) -> Any:
     """Return configuration parameter.
 
-    Possible options are 'sound', 'music', 'classic'."""
+    Possible options are 'sound', 'music', 'classic', 'fps', 'pacing',
+    'board', 'bots', 'level', 'leaderboard'."""
     return settings[option]
 
 
+def get_board() -> Size:
+    """Return board size (columns, rows)."""
+    return tuple(settings['board'])
+
+
 def get_key(action: str) -> Any:
     """Return necessary keys for a certain action.
 
-    Possible actions are 'grid', 'pause', 'accept', 'exit', 'direction',
-    'up', 'down', 'left', 'right'. 'direction' returns a dictionary, the
-    rest return an integer"""
-    if action in keymapping:
-        result = keymapping[action]
-    elif action in keymapping['direction'].values():
-        directions = {v: k for k, v in keymapping['direction'].items()}
-        result = int(directions[action])
-    return result
+    Possible actions are 'grid', 'pause', 'autopilot', 'accept', 'exit',
+    'direction', 'up', 'down', 'left', 'right'. 'direction' returns a
+    dictionary, the rest return an integer"""
+    if action == "direction":
+        return keymapping['direction']
+    return actionkeys[action]
+
+
+def get_action(key: int) -> str:
+    """Return the action bound to a keycode, None if it is not bound.
+
+    Scenes dispatch on actions instead of comparing keycodes."""
+    return keyactions.get(key)
+
+
+def compile_keymap(keys: dict) -> Dict[int, str]:
+    """Return a flat dictionary keycode -> action from key bindings."""
+    compiled = {int(k): v for k, v in keys['direction'].items()}
+    compiled.update({v: k for k, v in keys.items() if k != "direction"})
+    return compiled
 
 
 def get_keybindings() -> dict:
@@ -44,25 +73,26 @@ def get_keybindings() -> dict:
 
 
 def get_joke() -> str:
-    """Return a random pun."""
-    return random.choice(jokes)
-
+    """Return a random pun.
 
-def lower_highscore() -> int:
-    """Return lowest score in the top."""
-    return highscores[-1]['score']
+    Only that pun is read from the file, found through the offset table."""
+    if jokes is None:
+        return FALLBACK_JOKE
+    i = random.randrange(len(joke_offsets) - 1)
+    return jokes[joke_offsets[i]:joke_offsets[i+1]].decode("utf8").strip()
 
 
-def get_highscores() -> List[dict]:
-    """Return top highscores list."""
-    return highscores
+def get_legacy_highscores() -> Dict[str, List[dict]]:
+    """Return highscores found in an old config file, by board size."""
+    return legacy_highscores
 
 
 # SETS ======================================================================
 def set_settings(option: str, value: Any):
     """Set configuration parameter.
 
-    Possible options are 'sound', 'music', 'classic'."""
+    Possible options are 'sound', 'music', 'classic', 'fps', 'pacing',
+    'board', 'bots', 'level', 'leaderboard'."""
     settings[option] = value
 
 
@@ -71,6 +101,16 @@ def set_keybinding(keys: dict):
     global keymapping
 
     keymapping = keys
+    _rebuild_keymap()
+
+
+def _rebuild_keymap():
+    """Compile lookup tables, only needed when key bindings change."""
+    global keyactions
+    global actionkeys
+
+    keyactions = compile_keymap(keymapping)
+    actionkeys = {v: k for k, v in keyactions.items()}
 
 
 # I/O =======================================================================
@@ -80,7 +120,6 @@ def save_config():
     data = {}
     data['settings'] = settings
     data['keymapping'] = keymapping
-    data['highscores'] = highscores
     try:
         with open(CONFIG_FILE, "w", encoding="utf-8") as file_p:
             json.dump(data, file_p, indent=4)
@@ -93,7 +132,7 @@ def save_config():
 def load_config():
     """Load configuration from file."""
     global settings
-    global highscores
+    global legacy_highscores
 
     try:
         with open(CONFIG_FILE, "r", encoding="utf-8") as file_p:
@@ -103,16 +142,23 @@ def load_config():
         print(f"Error: could't load config from {CONFIG_FILE}.")
         save_config()
     else:
-        # Load values from file
-        settings = config['settings']
-        highscores = config['highscores']
+        # Load values from file, options missing in old files get defaults
+        settings = {**DEFAULT_SETTINGS, **config['settings']}
+        legacy_highscores = config.get('highscores', {})
+        if isinstance(legacy_highscores, list):
+            # Older files only had highscores of the original 25x20 board
+            legacy_highscores = {"25x20": legacy_highscores}
         keymapping['pause'] = config['keymapping']['pause']
         keymapping['grid'] = config['keymapping']['grid']
+        # Older files have no autopilot key, default one is kept
+        keymapping['autopilot'] = config['keymapping'].get(
+            'autopilot', keymapping['autopilot'])
         keymapping['exit'] = config['keymapping']['exit']
         keymapping['accept'] = config['keymapping']['accept']
         keymapping['direction'] = {}
         for key, value in config['keymapping']['direction'].items():
             keymapping['direction'][int(key)] = value
+        _rebuild_keymap()
 
         # Set volumes
         resources.set_volume(get_setting("sound"))
@@ -120,14 +166,64 @@ def load_config():
 
 
 def load_jokes():
-    """Load snake puns."""
+    """Map snake puns, one per line, and their offset table.
+
+    Nothing is parsed, so big pun packs don't slow down the start. The
+    table is built again if the pun file changed."""
     global jokes
+    global joke_offsets
 
     try:
-        with open(PUN_FILE, "r", encoding="utf8") as file_p:
-            data = json.load(file_p)
-    except EnvironmentError:
+        with open(PUN_FILE, "rb") as file_p:
+            jokes = mmap.mmap(file_p.fileno(), 0, access=mmap.ACCESS_READ)
+        offsets = _map_joke_index()
+        if offsets is None or offsets[-1] != len(jokes):
+            offsets = _build_joke_index()
+    except (EnvironmentError, ValueError):
+        # Missing or empty file
         print(f"Couldn't load data from {PUN_FILE}")
-        jokes = ["There are no snakes in my boot :("]
+        jokes = None
     else:
-        jokes = data['jokes']
+        joke_offsets = offsets
+        if len(joke_offsets) < 2:
+            # Only blank lines
+            jokes = None
+
+
+def _map_joke_index() -> memoryview:
+    """Return the offset table from file, None if missing or stale."""
+    try:
+        if os.path.getmtime(PUN_INDEX) < os.path.getmtime(PUN_FILE):
+            return None
+        with open(PUN_INDEX, "rb") as file_p:
+            index = mmap.mmap(file_p.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(index).cast("I")
+    except (EnvironmentError, ValueError, TypeError):
+        # Missing, empty or truncated
+        return None
+
+
+def _build_joke_index() -> array:
+    """Return the offset table of the pun file, saving it to file.
+
+    There is an offset where every pun starts, plus the end of file.
+    Blank lines are part of the previous pun, they are stripped."""
+    offsets = array("I")
+    start = 0
+    while start < len(jokes):
+        end = jokes.find(b"\n", start)
+        end = len(jokes) if end == -1 else end + 1
+        if jokes[start:end].strip():
+            offsets.append(start)
+        start = end
+    offsets.append(len(jokes))
+    try:
+        with open(PUN_INDEX, "wb") as file_p:
+            offsets.tofile(file_p)
+    except EnvironmentError:
+        print(f"Error: couldn't save pun index to {PUN_INDEX}.")
+    return offsets
+
+
+# Lookup tables for the default bindings, until config is loaded
+_rebuild_keymap()
@@ -2,32 +2,23 @@
 
 TODO:
 - More settings: show/hide fps,
-                 set fps (ex. 3 modes: 30, 60, unlocked.
-                          Change transition scene duration, menu scene speed),
-                 resize screen (width multiple of BLOCK[0],
-                                height multiple of BLOCK[1],
-                                width < menu-bg width,
-                                add size to highscores (changes difficulty).
-                                ex. 4 modes, 640x480 (20x15 squares),
-                                             800x640 (25x20 squares),
-                                             1024x576 (32x18 squares),
-                                             1024x768 (32x24 squares).
-                                Change hardcoded coordinates in scenes.py),
+                 window size (width < menu-bg width),
                  fullscreen.
-- obstacles.
 - grass effect when snake is moving.
-- joystick support (rewrite "enter highscore" screen).
-- online mode."""
+- joystick support (rewrite "enter highscore" screen)."""
 import os
 
 import pygame
 
 import settings
 import resources
+import scores
+import latency
+import leaderboard
 from scenes import SceneBase, SceneMenu
 
 
-def run_game(width: int, height: int, fps: int, starting_scene: SceneBase):
+def run_game(width: int, height: int, starting_scene: SceneBase):
     """Main function that moves everything. Don't delete it."""
     pygame.mixer.pre_init(44100, -16, 2, 1024)
     os.environ['SDL_VIDEO_CENTERED'] = "1"
@@ -41,10 +32,13 @@ def run_game(width: int, height: int, fps: int, starting_scene: SceneBase):
     # Load game data
     resources.load_assets()
     settings.load_config()
+    scores.load_scores(settings.get_legacy_highscores())
     settings.load_jokes()
+    if settings.get_setting("leaderboard"):
+        leaderboard.start(settings.get_setting("leaderboard"))
 
     # Start first scene
-    active_scene = starting_scene()
+    active_scene = starting_scene.visit()
 
     while active_scene is not None:
         # Handle events
@@ -58,7 +52,7 @@ def run_game(width: int, height: int, fps: int, starting_scene: SceneBase):
             elif event.type == pygame.KEYDOWN:
                 alt_pressed = (pressed_keys[pygame.K_LALT] or
                                pressed_keys[pygame.K_RALT])
-                if event.key == settings.get_key("exit"):
+                if settings.get_action(event.key) == "exit":
                     quit_attempt = True
                 elif event.key == pygame.K_F4 and alt_pressed:
                     quit_attempt = True
@@ -75,12 +69,33 @@ def run_game(width: int, height: int, fps: int, starting_scene: SceneBase):
         active_scene.render(screen)
 
         # To next scene or continue in the same
+        if active_scene.next is not active_scene:
+            active_scene.exit()
         active_scene = active_scene.next
 
         pygame.display.flip()
-        clock.tick(fps)
+        if latency.enabled:
+            latency.track_flipped()
+
+        # Frame pacing, it can be changed in settings while playing
+        fps = settings.get_setting("fps")
+        pacing = settings.get_setting("pacing")
+        if pacing == "precise":
+            clock.tick_busy_loop(fps)
+        elif pacing == "uncapped":
+            clock.tick()
+        else:
+            clock.tick(fps)
         pygame.display.set_caption(f"Snake - {clock.get_fps():2.0f} fps")
 
+    leaderboard.stop()
+
+    # Report time lost loading music
+    stalls = resources.get_music_stalls()
+    if stalls:
+        print(f"Music loaded {len(stalls)} times,"
+              f" longest stall {max(stalls):.1f} ms.")
+
 if __name__ == "__main__":
-    run_game(800, 640, 60, SceneMenu)
+    run_game(800, 640, SceneMenu)
     pygame.quit()
@@ -0,0 +1,437 @@
+"""Live games for spectators, from one host to many viewers.
+
+The host broadcasts the game being played: every tick is sent as a
+diff, with the new head, how long the snake is, so removed tail pieces
+are implied, and where the apple is. Viewers that joined late or can't
+keep up get a keyframe, the whole snake, instead of the diffs they
+missed. Diffs are never queued for a slow viewer: once too many bytes
+wait to be sent to it, it is skipped until they are sent, then it gets
+a keyframe.
+
+The game loop never waits for the network, it only hands the diff over
+to the network thread, as in netcode.
+
+    python spectator.py host --port 8766
+    python spectator.py view --host localhost --headless --save lobby.png
+"""
+import os
+import struct
+import argparse
+import threading
+import asyncio
+from time import perf_counter
+from typing import Any, Optional, Tuple
+
+import pygame
+
+import levels
+import resources
+from netcode import frame, read_message, cell_format
+from objects import Board, Apple, Snake
+from helpers import (build_background, get_surface, scale_tile,
+                     split_sprites, draw_walls)
+from consts import BGCOLOR, BLACK, WHITE, Size
+
+PORT = 8766
+# Bytes waiting to be sent to a viewer before it only gets keyframes, and
+# before it gets one again
+HIGH_WATER = 64 * 1024
+LOW_WATER = 16 * 1024
+
+# Message types, framed as in netcode
+KEYFRAME = b"K"
+DIFF = b"D"
+# Game states
+PLAYING = 0
+PAUSED = 1
+CRASHED = 2
+
+# Host state, the network thread owns the viewers
+loop = None
+worker = None
+# Whether every viewer got the last diff, by writer
+viewers = {}
+# Tasks talking to viewers
+handlers = set()
+# Board size and level of the game, and its snake rebuilt from the
+# diffs, to send keyframes from
+game = None
+mirror = None
+# Last state published, (board, serial, length, apple, state)
+last = None
+stats = {'viewers': 0, 'bytes_out': 0, 'diffs': 0, 'keyframes': 0,
+         'skipped': 0}
+
+
+# GETS ======================================================================
+def get_stats() -> dict:
+    """Return viewers now, bytes sent, and diffs and keyframes sent and
+    diffs skipped for slow viewers."""
+    result = dict(stats)
+    result['viewers'] = len(viewers)
+    return result
+
+
+def encode_state(fmt: str, serial: int, length: int, state: int, apple: int,
+                 cells: list, directions: bytes) -> bytes:
+    """Return the last pieces of a snake and the apple, ready to be sent."""
+    return b"".join((
+        struct.pack(f"!IIB{fmt}I", serial, length, state, apple, len(cells)),
+        struct.pack(f"!{len(cells)}{fmt}", *cells), bytes(directions)))
+
+
+def decode_state(body: bytes, fmt: str) -> Tuple:
+    """Return head serial, length, state, apple, cells and directions."""
+    offset = struct.calcsize(f"!IIB{fmt}I")
+    serial, length, state, apple, count = struct.unpack(
+        f"!IIB{fmt}I", body[:offset])
+    end = offset + count * struct.calcsize(fmt)
+    cells = struct.unpack(f"!{count}{fmt}", body[offset:end])
+    return serial, length, state, apple, cells, body[end:end + count]
+
+
+# HOST ======================================================================
+def start(host: str = "", port: int = PORT):
+    """Start broadcasting games, from a new thread."""
+    global loop
+    global worker
+
+    if worker is not None:
+        return
+    loop = asyncio.new_event_loop()
+    worker = threading.Thread(target=_run_host, args=(host, port),
+                              name="spectator", daemon=True)
+    worker.start()
+
+
+def stop():
+    """Stop broadcasting, closing every viewer."""
+    global worker
+
+    if worker is None:
+        return
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(loop.stop)
+    worker.join(1.0)
+    worker = None
+
+
+def new_game():
+    """Tell viewers a new game begins, they get a keyframe."""
+    global last
+    last = None
+
+
+def publish(scene: Any):
+    """Send what changed in a game scene since last call, if anything."""
+    global last
+
+    if worker is None or loop.is_closed():
+        return
+    board, snake = scene.board, scene.sneik
+    state = (CRASHED if scene.has_crashed
+             else PAUSED if scene.is_paused else PLAYING)
+    current = (board, snake.serial, len(snake), scene.apple.pos, state)
+    if current == last:
+        return
+    length = len(snake)
+    header = None
+    if last is None or last[0] is not board:
+        # Whole snake, viewers rebuild the game
+        count = length
+        header = (board.size, scene.layout[2])
+    else:
+        count = min(length, snake.serial - last[1])
+    last = current
+    loop.call_soon_threadsafe(
+        _broadcast, header, snake.serial, length, state,
+        board.pack(scene.apple.pos), snake.cells[length - count:],
+        bytes(snake.directions[length - count:]))
+
+
+def _run_host(host: str, port: int):
+    """Accept viewers until stopped."""
+    asyncio.set_event_loop(loop)
+    try:
+        server = loop.run_until_complete(
+            asyncio.start_server(_accept, host, port))
+    except OSError as error:
+        print(f"Error: couldn't broadcast on port {port}: {error}")
+        loop.close()
+        return
+    print(f"Broadcasting on port {port}.")
+    loop.run_forever()
+    server.close()
+    # Data waiting for slow viewers is dropped
+    for writer in viewers:
+        writer.transport.abort()
+    if handlers:
+        loop.run_until_complete(asyncio.wait(handlers, timeout=1.0))
+    viewers.clear()
+    loop.close()
+
+
+def _accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Start talking to a new viewer."""
+    handler = loop.create_task(_handle(reader, writer))
+    handlers.add(handler)
+    handler.add_done_callback(handlers.discard)
+
+
+async def _handle(reader: asyncio.StreamReader,
+                  writer: asyncio.StreamWriter):
+    """Keep a viewer until it leaves, viewers don't send anything."""
+    viewers[writer] = False
+    if mirror is not None:
+        _send(writer, _keyframe())
+        viewers[writer] = True
+    try:
+        while await reader.read(1024):
+            pass
+    except OSError:
+        pass
+    finally:
+        viewers.pop(writer, None)
+        writer.close()
+
+
+def _send(writer: asyncio.StreamWriter, payload: bytes):
+    """Send a message to a viewer, from the network thread."""
+    message = frame(payload)
+    stats['bytes_out'] += len(message)
+    writer.write(message)
+
+
+def _keyframe() -> bytes:
+    """Return a message with the whole game."""
+    (cols, rows), level = game[0]
+    level = level.encode("utf8")
+    stats['keyframes'] += 1
+    return b"".join((
+        KEYFRAME, struct.pack("!HHB", cols, rows, len(level)), level,
+        encode_state(cell_format((cols, rows)), mirror.serial, len(mirror),
+                     game[1], game[2], mirror.cells, mirror.directions)))
+
+
+def _broadcast(header: Optional[Tuple[Size, str]], serial: int, length: int,
+               state: int, apple: int, cells: list, directions: bytes):
+    """Send a diff to every viewer that can take it, from the network
+    thread."""
+    global game
+    global mirror
+
+    if header is not None:
+        size = header[0]
+        mirror = Snake(Board(size, pygame.Rect(0, 0, *size)))
+        mirror.clear()
+    game = (header or game[0], state, apple)
+    mirror.sync(serial, length, cells, directions)
+
+    diff = None
+    keyframe = None
+    for writer, synced in viewers.items():
+        if writer.transport.is_closing():
+            continue
+        waiting = writer.transport.get_write_buffer_size()
+        if synced and header is None and waiting <= HIGH_WATER:
+            if diff is None:
+                diff = DIFF + encode_state(cell_format(mirror.board.size),
+                                           serial, length, state, apple,
+                                           cells, directions)
+            _send(writer, diff)
+            stats['diffs'] += 1
+        elif waiting <= LOW_WATER:
+            # Built once for every viewer catching up in this tick
+            if keyframe is None:
+                keyframe = _keyframe()
+            _send(writer, keyframe)
+            viewers[writer] = True
+        else:
+            viewers[writer] = False
+            stats['skipped'] += 1
+
+
+# VIEWER ====================================================================
+class Viewer:
+    """A broadcast game, drawn on a surface with the sprites of the game.
+
+    It only needs a display surface, so it runs headless too."""
+
+    def __init__(self, surface: pygame.Surface, classic: bool = False):
+        self.surface = surface
+        self.classic = classic
+        self.layout = None
+        self.board = None
+        self.snake = None
+        self.apple = None
+        self.background = None
+        # Background repeats every period, in pixels
+        self.period = (0, 0)
+        self.state = PLAYING
+        self.frames = 0
+        self.draw_time = 0.0
+
+    def build(self, size: Size, level: str):
+        """Create board, background, snake and apple of a new layout."""
+        walls = levels.load_level(level, size) if level else None
+        self.board = Board(size, self.surface.get_rect(), walls)
+        cell_w, cell_h = self.board.cell
+        if not self.classic:
+            tile = scale_tile(resources.get_image("snake-tile1"),
+                              self.board.cell)
+            apple_skin, snake_skin = split_sprites(
+                resources.get_sprite("sheet"), self.board.cell)
+        else:
+            tile = get_surface((cell_w * 16, cell_h * 16), BGCOLOR, 255)
+            apple_skin, snake_skin = None, None
+
+        # Walls are drawn once, over the whole board plus a view to wrap
+        # around, as in the game
+        size = self.board.rect.size
+        self.period = tile.get_size()
+        if walls is not None and self.board.scrolls:
+            self.period = (self.board.cols * cell_w, self.board.rows * cell_h)
+            size = (self.period[0] + size[0], self.period[1] + size[1])
+        self.background = build_background(tile, size)
+        if walls is not None:
+            self.background = self.background.copy()
+            draw_walls(self.background, walls, self.board.size,
+                       self.board.cell, not self.classic)
+
+        self.snake = Snake(self.board)
+        self.snake.load_skin(snake_skin)
+        self.apple = Apple(self.snake, self.board, apple_skin)
+
+    def keyframe(self, size: Size, level: str, state: Tuple):
+        """Start over from the whole game."""
+        if (size, level) != self.layout:
+            self.layout = (size, level)
+            self.build(size, level)
+        self.snake.clear()
+        self.apply(*state)
+        self.board.center(self.snake.get_head())
+
+    def apply(self, serial: int, length: int, state: int, apple: int,
+              cells: list, directions: bytes):
+        """Update snake and apple from a diff."""
+        self.snake.sync(serial, length, cells, directions)
+        self.apple.pos = self.board.unpack(apple)
+        self.state = state
+        self.board.follow(self.snake.get_head())
+
+    def draw(self):
+        """Draw the game as it is now."""
+        start_time = perf_counter()
+        self.surface.fill(BLACK)
+        scroll_x, scroll_y = self.board.scroll()
+        self.surface.blit(self.background, self.board.rect,
+                          pygame.Rect(scroll_x % self.period[0],
+                                      scroll_y % self.period[1],
+                                      *self.board.rect.size))
+        self.snake.draw(self.surface)
+        self.apple.draw(self.surface)
+
+        text = f"Score: {len(self.snake) - 2}"
+        if self.state != PLAYING:
+            text += " - Paused" if self.state == PAUSED else " - Crashed"
+        resources.get_font("normal25").render_to(self.surface, (10, 10),
+                                                 text, WHITE)
+        self.frames += 1
+        self.draw_time += perf_counter() - start_time
+
+
+async def watch(viewer: Viewer, host: str, port: int, save: str = None,
+                every: float = 1.0, window: bool = False):
+    """Draw a broadcast game until the host closes it.
+
+    Parameter save is an image file where the game is saved every few
+    seconds, replaced at once so it can be shown while written."""
+    reader, writer = await asyncio.open_connection(host, port)
+    fmt = "H"
+    saved = 0.0
+    try:
+        while True:
+            payload = await read_message(reader)
+            kind, body = payload[:1], payload[1:]
+            if kind == KEYFRAME:
+                cols, rows, count = struct.unpack("!HHB", body[:5])
+                level = body[5:5 + count].decode("utf8")
+                fmt = cell_format((cols, rows))
+                viewer.keyframe((cols, rows), level,
+                                decode_state(body[5 + count:], fmt))
+            elif kind == DIFF and viewer.board is not None:
+                viewer.apply(*decode_state(body, fmt))
+            else:
+                continue
+            viewer.draw()
+
+            if window:
+                pygame.event.pump()
+                pygame.display.flip()
+            if save and perf_counter() - saved >= every:
+                saved = perf_counter()
+                name, extension = os.path.splitext(save)
+                pygame.image.save(viewer.surface, name + ".tmp" + extension)
+                os.replace(name + ".tmp" + extension, save)
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+def run_viewer(args: Any):
+    """Watch a host until it stops, or for some seconds."""
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.init()
+    screen = pygame.display.set_mode((args.width, args.height))
+    pygame.display.set_caption("Snake - spectator")
+    resources.load_assets()
+    viewer = Viewer(screen, args.classic)
+
+    event_loop = asyncio.get_event_loop()
+    task = watch(viewer, args.host, args.port, args.save, args.every,
+                 not args.headless)
+    try:
+        event_loop.run_until_complete(asyncio.wait_for(task, args.seconds))
+    except asyncio.TimeoutError:
+        pass
+    except OSError as error:
+        print(f"Error: couldn't watch {args.host}:{args.port}: {error}")
+    except KeyboardInterrupt:
+        pass
+    if viewer.frames:
+        print(f"{viewer.frames} frames drawn, mean"
+              f" {viewer.draw_time / viewer.frames * 1000:.2f} ms.")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("role", choices=["host", "view"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--headless", action="store_true",
+                        help="view without a window")
+    parser.add_argument("--save", default=None,
+                        help="image file to save the game to")
+    parser.add_argument("--every", type=float, default=1.0,
+                        help="seconds between saved images")
+    parser.add_argument("--seconds", type=float, default=None,
+                        help="stop viewing after some seconds")
+    parser.add_argument("--classic", action="store_true")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=640)
+    args = parser.parse_args()
+    if args.role == "host":
+        # Game modules import this one as 'spectator', not as '__main__'
+        import spectator
+        from scenes import SceneMenu
+        from snake import run_game
+        spectator.start("", args.port)
+        run_game(800, 640, SceneMenu)
+        spectator.stop()
+        pygame.quit()
+    else:
+        run_viewer(args)